@@ -5,11 +5,17 @@ from pydantic import BaseModel
 from typing import Optional
 from services.supabase_client import supabase_client
 from services.gemini_client import get_embedding
-from services.groq_client import groq_client, GROQ_MODEL_FAST
+from services.groq_client import create_chat_completion, GROQ_MODEL_FAST
+from services.context import pack_for_model
+from services.retrieval import hybrid_search
+from services.query_cache import query_cache, LIBRARY_SCOPE
 import json
 
 router = APIRouter()
 
+# Ranked matches fetched per query; the context packer keeps as many as fit the token budget
+CHAT_CANDIDATES = 10
+
 @router.post("/stream")
 async def chat_stream(req: ChatRequest):
     """Provide a streaming chat response using RAG."""
@@ -19,27 +25,25 @@ async def chat_stream(req: ChatRequest):
     user_query = req.messages[-1].content
     
     try:
-        # 1. Embed user query
-        query_embedding = await get_embedding(user_query)
-        
-        # 2. Similarity search via RPC function
-        if req.document_id:
-            # Single document search
-            rpc_res = supabase_client.rpc(
-                "match_document_chunks", 
-                {"query_embedding": query_embedding, "match_count": 5, "doc_id": req.document_id}
-            ).execute()
-        else:
-            # Global library search
-            rpc_res = supabase_client.rpc(
-                "match_document_chunks_global", 
-                {"query_embedding": query_embedding, "match_count": 7}
-            ).execute()
+        # 1. An exact repeat of a recent query reuses its chunks without embedding
+        scope = req.document_id or LIBRARY_SCOPE
+        similar_chunks = query_cache.get_text(scope, user_query) if query_cache else None
+
+        if similar_chunks is None:
+            # 2. Embed user query; a close rephrasing of a recent query reuses its chunks
+            query_embedding = await get_embedding(user_query)
+            similar_chunks = query_cache.get_similar(scope, query_embedding) if query_cache else None
+
+            # 3. Hybrid vector + BM25 search (single document, or the whole library)
+            if similar_chunks is None:
+                similar_chunks = await hybrid_search(user_query, query_embedding, CHAT_CANDIDATES, req.document_id)
+            if query_cache:
+                query_cache.put(scope, user_query, query_embedding, similar_chunks)
             
-        similar_chunks = rpc_res.data or []
-        context_text = "\n\n".join([chunk["content"] for chunk in similar_chunks]) if similar_chunks else "No relevant context found."
+        # 4. Fill the model's context budget from the ranked matches
+        context_text = pack_for_model(similar_chunks, GROQ_MODEL_FAST).text if similar_chunks else "No relevant context found."
         
-        # 3. Build message history for Groq
+        # 5. Build message history for Groq
         history = []
         for msg in req.messages[:-1]:
             role = 'assistant' if msg.role == 'assistant' else 'user'
@@ -60,10 +64,10 @@ async def chat_stream(req: ChatRequest):
 
         history.append({"role": "user", "content": final_user_message})
 
-        # 4. Stream response
+        # 6. Stream response
         async def event_generator():
             try:
-                stream = await groq_client.chat.completions.create(
+                stream = await create_chat_completion(
                     model=GROQ_MODEL_FAST,
                     messages=history,
                     stream=True,
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import typing_extensions as typing
@@ -8,162 +9,126 @@ from services.supabase_client import (
     get_user_credits, 
     deduct_credit, 
     get_cached_content, 
-    cache_content
+    cache_content,
+    get_cached_explanation,
+    cache_explanation
 )
 import services.gemini_client as gemini
 import services.groq_client as groq
 from models.schemas import Flashcard, MCQQuestion
+from services.single_flight import SingleFlight
+from services.json_stream import JsonArrayItemParser
+from services.context import pack_for_model
+from services.retrieval import hybrid_search
+import services.study_material as study_material
 
 router = APIRouter()
 
+# Document text budget (tokens) for the topic explanation prompt
+EXPLAIN_CONTEXT_TOKENS = 2000
+# Chunks retrieved for a topic explanation
+EXPLAIN_TOP_K = 4
+
+# In-flight topic explanations, keyed by ("explain", document_id, topic, fresh)
+_generations = SingleFlight()
+
 class DocumentRequest(BaseModel):
     document_id: str
     difficulty: Optional[str] = "medium"
     is_adaptive: Optional[bool] = False
+    fresh: Optional[bool] = False  # skip the LLM response cache and regenerate
+
+def _http_error(e: Exception) -> HTTPException | None:
+    """The HTTP error for a study material error the client can act on, or None."""
+    if isinstance(e, study_material.InsufficientCreditsError):
+        return HTTPException(status_code=402, detail=str(e))
+    if isinstance(e, study_material.DocumentNotFoundError):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, study_material.NoContentError):
+        return HTTPException(status_code=400, detail=str(e))
+    return None
 
 @router.post("/all")
 async def generate_all(req: DocumentRequest):
     try:
-        # 1. Check cache (only for medium difficulty and non-adaptive to avoid schema changes)
-        if req.difficulty == "medium" and not req.is_adaptive:
-            cache = await get_cached_content(req.document_id)
-            if cache:
-                return {
-                    "flashcards": cache["flashcards"],
-                    "questions": cache["quiz"]
-                }
-
-        # 2. Check and deduct credits
-        if not await deduct_credit():
-            raise HTTPException(status_code=402, detail="Insufficient credits.")
-
-        # 3. Get document context and source type
-        doc_res = supabase_client.table("documents").select("*").eq("id", req.document_id).single().execute()
-        if not doc_res.data:
-            raise HTTPException(status_code=404, detail="Document not found.")
-        
-        source_type = doc_res.data["source_type"]
-        source_url = doc_res.data.get("source_url", "")
-        master_summary = doc_res.data.get("master_summary", "")
-        
-        # Check for explicitly logged background task failures
-        if master_summary and master_summary.startswith("ERROR:"):
-            raise HTTPException(status_code=400, detail=f"Background Processing Failed: {master_summary}")
-
-        # Fast Path: If we have a Map-Reduced Master Summary, format it directly
-        if master_summary:
-            context_part = f"""
-            Pre-computed Document Master Summary & Knowledge Base:
-            {master_summary}
-            
-            Based ENTIRELY on the structured knowledge above, generate the requested quiz and flashcards.
-            """
-        else:
-            # LEGACY FALLBACK: Pull chunks directly if summary is missing
-            chunks_res = supabase_client.table("document_chunks") \
-                .select("content") \
-                .eq("document_id", req.document_id) \
-                .limit(5) \
-                .execute()
-            
-            if chunks_res.data:
-                combined_text = "\n\n".join([c["content"] for c in chunks_res.data])
-                context_part = f"""
-                Document Content Excerpts:
-                {combined_text}
-                
-                Based on the excerpts above, generate the requested study material.
-                """
-            elif source_type == "youtube" and not source_url:
-                context_part = f"""
-                YouTube Video Transcript unavailable. Based on your knowledge:
-                - Look up or infer the title and subject matter of this specific YouTube video
-                - Identify the CORE EDUCATIONAL TOPIC it teaches
-                - Focus entirely on the SUBJECT MATTER
-                - Generate the flashcards and quiz
-                """
-            else:
-                raise HTTPException(status_code=400, detail="No content found for this document.")
-            
-
-
-        difficulty_prompt = {
-            "easy": "Write EASY questions. Focus on basic definitions, direct recall of facts, and fundamental concepts. Use simple language.",
-            "medium": "Write MEDIUM questions. Focus on standard application, understanding of core concepts, and general knowledge. This is the standard difficulty.",
-            "hard": "Write HARD questions. Focus on complex synthesis, multi-step analysis, edge cases, and critical thinking. The distractors (wrong options) should be highly plausible."
-        }.get(req.difficulty.lower(), "Write questions of STANDARD difficulty.")
-
-        adaptive_prompt = ""
-        if req.is_adaptive:
-            # Fetch the user's wrong answers from recent attempts for this document
-            attempts_res = supabase_client.table("quiz_attempts") \
-                .select("wrong_answers") \
-                .eq("document_id", req.document_id) \
-                .not_.is_('wrong_answers', 'null') \
-                .order("created_at", desc=True) \
-                .limit(3) \
-                .execute()
-            
-            wrong_qs = []
-            if attempts_res.data:
-                for attempt in attempts_res.data:
-                    for key, val_str in attempt["wrong_answers"].items():
-                        try:
-                            val = json.loads(val_str) if isinstance(val_str, str) else val_str
-                            wrong_qs.append(val.get("question", ""))
-                        except:
-                            pass
-            
-            if wrong_qs:
-                adaptive_prompt = f"""
-                ADAPTIVE LEARNING OVERRIDE:
-                The student previously got questions related to these topics WRONG:
-                {json.dumps(wrong_qs[:10], indent=2)}
-
-                CRITICAL INSTRUCTION: You MUST heavily bias the generated Flashcards and Quiz questions towards these specific weak areas. 
-                Ensure they review the core concepts needed to answer those specific questions correctly next time.
-                """
-
-        prompt = f"""
-        Generate BOTH 10-12 key flashcards AND a 5-8 question multiple-choice quiz on the educational topic from the source below.
-        
-        Difficulty Instruction:
-        {difficulty_prompt}
-
-        {adaptive_prompt}
-        
-        Rules:
-        - FLASHCARDS: each must have 'question' and 'answer' about factual content, definitions, or concepts
-        - QUIZ: each must have 'question', 4 'options', and 'correct_answer' (must exactly match one of the options)
-        - Focus only on teaching the CORE SUBJECT MATTER — not describing the video itself
-        - Write everything in English
-        - Output valid JSON with exactly two keys: "flashcards" and "questions"
-        
-        {context_part}
-        """
-
-        # 4. Call AI service — Groq for both YouTube and PDF (Gemini quota exhausted)
-        raw_response = await groq.generate_study_material(prompt)
-        
-        data = json.loads(raw_response)
-        flashcards = data.get("flashcards", [])
-        quiz = data.get("questions", [])
-
-        # 5. Cache result (only if medium)
-        if req.difficulty == "medium":
-            await cache_content(req.document_id, flashcards, quiz)
+        weak_areas = study_material.fetch_weak_areas(req.document_id) if req.is_adaptive else []
+        return await study_material.generate_study_set(req.document_id, req.difficulty, weak_areas, bool(req.fresh))
+    except HTTPException:
+        raise
+    except Exception as e:
+        if (error := _http_error(e)) is not None:
+            raise error
+        import traceback
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {
-            "flashcards": flashcards,
-            "questions": quiz
-        }
+@router.post("/all/stream")
+async def generate_all_stream(req: DocumentRequest):
+    """
+    Streams the flashcards and quiz as SSE events: one {"flashcard": ...} or {"question": ...}
+    event per item as soon as the model has finished writing it, then a {"result": ...}
+    event with everything, then [DONE]. The final result is cached like /all when the model finished it.
+    """
+    try:
+        difficulty = req.difficulty.lower()
+        weak_areas = study_material.fetch_weak_areas(req.document_id) if req.is_adaptive else []
+        variant = study_material.variant_hash(weak_areas)
+        cached = None if req.fresh else await get_cached_content(req.document_id, difficulty, variant)
+        prompt = None if cached else await study_material.build_study_set_prompt(req.document_id, difficulty, weak_areas)
     except HTTPException:
         raise
     except Exception as e:
+        if (error := _http_error(e)) is not None:
+            raise error
         import traceback
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def event_generator():
+        try:
+            if cached:
+                flashcards, quiz = cached["flashcards"], cached["quiz"]
+                for card in flashcards:
+                    yield f"data: {json.dumps({'flashcard': card})}\n\n"
+                for question in quiz:
+                    yield f"data: {json.dumps({'question': question})}\n\n"
+            else:
+                # JSON mode is not available while streaming; the prompt already asks for plain JSON
+                stream = await groq.create_chat_completion(
+                    model=groq.GROQ_MODEL_FAST,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.7,
+                    max_tokens=700,
+                    stream=True,
+                )
+                parser = JsonArrayItemParser()
+                flashcards, quiz = [], []
+                finish_reason = None
+                async for chunk in stream:
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+                    for key, item in parser.feed(content):
+                        if key == "flashcards":
+                            flashcards.append(item)
+                            yield f"data: {json.dumps({'flashcard': item})}\n\n"
+                        elif key == "questions":
+                            quiz.append(item)
+                            yield f"data: {json.dumps({'question': item})}\n\n"
+
+                # A stream cut off at max_tokens holds a partial set; only a complete one is cached
+                if (flashcards or quiz) and finish_reason == "stop":
+                    await cache_content(req.document_id, flashcards, quiz, difficulty, variant)
+
+            yield f"data: {json.dumps({'result': {'flashcards': flashcards, 'questions': quiz}})}\n\n"
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
 @router.post("/flashcards", response_model=List[Flashcard])
 async def generate_flashcards(req: DocumentRequest):
     # Use the unified logic but return only flashcards for compatibility
@@ -179,45 +144,12 @@ async def generate_quiz(req: DocumentRequest):
 @router.post("/mindmap")
 async def generate_mindmap(req: DocumentRequest):
     try:
-        if not await deduct_credit():
-            raise HTTPException(status_code=402, detail="Insufficient credits.")
-
-        doc_res = supabase_client.table("documents").select("*").eq("id", req.document_id).single().execute()
-        if not doc_res.data:
-            raise HTTPException(status_code=404, detail="Document not found.")
-        
-        chunks_res = supabase_client.table("document_chunks") \
-            .select("content") \
-            .eq("document_id", req.document_id) \
-            .execute()
-        
-        # HARD CAP limit to prevent massive payload tokens
-        combined_text = "\n\n".join([item["content"] for item in chunks_res.data[:5]]) if chunks_res.data else ""
-        
-        prompt = f"""
-        Extract the core concepts from the following text and return them strictly in JSON format to build a React Flow graph.
-        
-        Rules:
-        - Output MUST be valid JSON with EXACTLY two keys: "nodes" and "edges"
-        - "nodes" must be an array of objects: {{"id": "unique_string", "data": {{"label": "Topic Name"}}}}
-        - "edges" must be an array of objects: {{"id": "e_source_target", "source": "source_node_id", "target": "target_node_id"}}
-        - Ensure every target in an edge explicitly matches a valid node id.
-        - Create a rich, detailed hierarchy (aim for 10-20 nodes).
-        
-        Content:
-        {combined_text[:6000]}
-        """
-
-        raw_response = await groq.generate_study_material(prompt)
-        data = json.loads(raw_response)
-        
-        return {
-            "nodes": data.get("nodes", []),
-            "edges": data.get("edges", [])
-        }
+        return await study_material.generate_mindmap(req.document_id, bool(req.fresh))
     except HTTPException:
         raise
     except Exception as e:
+        if (error := _http_error(e)) is not None:
+            raise error
         import traceback
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
@@ -225,40 +157,22 @@ async def generate_mindmap(req: DocumentRequest):
 class TopicRequest(BaseModel):
     document_id: str
     topic: str
+    fresh: Optional[bool] = False
+
+def _topic_key(topic: str) -> str:
+    """Case, whitespace and surrounding punctuation don't change which explanation a topic gets."""
+    return " ".join(topic.lower().split()).strip(" .,:;!?\"'")
 
 @router.post("/explain-topic")
 async def explain_topic(req: TopicRequest):
     try:
-        if not await deduct_credit():
-            raise HTTPException(status_code=402, detail="Insufficient credits.")
-
-        doc_res = supabase_client.table("documents").select("*").eq("id", req.document_id).single().execute()
-        if not doc_res.data:
-            raise HTTPException(status_code=404, detail="Document not found.")
-        
-        chunks_res = supabase_client.table("document_chunks") \
-            .select("content") \
-            .eq("document_id", req.document_id) \
-            .execute()
-        
-        # HARD CAP limit to prevent massive payload tokens
-        combined_text = "\n\n".join([item["content"] for item in chunks_res.data[:5]]) if chunks_res.data else ""
-        
-        prompt = f"""
-        Based on the following content, explain the subtopic "{req.topic}" in detail.
-        Provide a concise but thorough explanation (2-3 paragraphs) that connects this topic to the broader context of the document.
-        Keep the formatting clean and readable using markdown.
-        IMPORTANT: You MUST respond entirely in English.
-        
-        Content:
-        {combined_text[:6000]}
-        """
+        topic_key = _topic_key(req.topic)
+        if not req.fresh:
+            cached = await get_cached_explanation(req.document_id, topic_key)
+            if cached:
+                return {"explanation": cached["explanation"]}
 
-        raw_response = await groq.generate_study_material(prompt, response_format=None)
-        
-        return {
-            "explanation": raw_response
-        }
+        return await _generations.run(("explain", req.document_id, topic_key, bool(req.fresh)), lambda: _explain_topic(req, topic_key))
     except HTTPException:
         raise
     except Exception as e:
@@ -266,6 +180,36 @@ async def explain_topic(req: TopicRequest):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _explain_topic(req: TopicRequest, topic_key: str) -> dict:
+    if not await deduct_credit():
+        raise HTTPException(status_code=402, detail="Insufficient credits.")
+
+    doc_res = supabase_client.table("documents").select("id").eq("id", req.document_id).execute()
+    if not doc_res.data:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    
+    # Only the chunks closest to the topic, packed to the token budget
+    query_embedding = await gemini.get_embedding(req.topic)
+    chunks = await hybrid_search(req.topic, query_embedding, EXPLAIN_TOP_K, req.document_id) or study_material.leading_chunks(req.document_id, EXPLAIN_CONTEXT_TOKENS)
+    combined_text = pack_for_model(chunks, groq.GROQ_MODEL_FAST, EXPLAIN_CONTEXT_TOKENS).text
+    
+    prompt = f"""
+    Based on the following content, explain the subtopic "{req.topic}" in detail.
+    Provide a concise but thorough explanation (2-3 paragraphs) that connects this topic to the broader context of the document.
+    Keep the formatting clean and readable using markdown.
+    IMPORTANT: You MUST respond entirely in English.
+    
+    Content:
+    {combined_text}
+    """
+
+    raw_response = await groq.generate_study_material(prompt, response_format=None, cache=not req.fresh)
+    await cache_explanation(req.document_id, topic_key, req.topic, raw_response)
+    
+    return {
+        "explanation": raw_response
+    }
+
 class NotesRequest(BaseModel):
     raw_notes: str
 
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+import asyncio
 import json
 from services.supabase_client import supabase_client, deduct_credit
 import services.groq_client as groq
@@ -10,6 +11,131 @@ class PathRequest(BaseModel):
     goal: str
     days: int
 
+# Plans longer than this are outlined in weekly themes first, then each week's days are
+# generated in parallel, so output size per call (and latency) stays flat as `days` grows
+SEGMENT_THRESHOLD_DAYS = 14
+DAYS_PER_SEGMENT = 7
+
+async def _generate_single_roadmap(goal: str, days: int) -> dict:
+    prompt = f"""
+    You are an elite AI Study Coach. The user wants to learn the following topic: "{goal}"
+    They have exactly {days} days to achieve this goal.
+    
+    Create a detailed, day-by-day learning roadmap. 
+    Break the topic down into logical progressions.
+    
+    CRITICAL OUTPUT INSTRUCTIONS:
+    1. You must output ONLY valid JSON. 
+    2. You MUST generate EXACTLY {days} objects in the "days" array. Do not stop at 10 or 15 days.
+    3. Even if the topic is simple, spread it across the full {days} days.
+    
+    JSON Structure:
+    {{
+        "days": [
+            {{
+                "day": 1,
+                "topic": "Title of the day's focus",
+                "description": "Short 1-2 sentence explanation of what to study",
+                "completed": false
+            }},
+            ... (continue for all {days} days)
+        ]
+    }}
+    """
+
+    raw_response = await groq.generate_study_material(
+        prompt, 
+        model=groq.GROQ_MODEL_SMART, 
+        max_tokens=1500
+    )
+    roadmap_data = json.loads(raw_response)
+
+    # Ensure the 'completed' field exists and is false
+    if "days" in roadmap_data:
+        for day in roadmap_data["days"]:
+            day["completed"] = False
+    return roadmap_data
+
+async def _generate_outline(goal: str, days: int) -> list[dict]:
+    """Weekly themes covering the whole plan, in order."""
+    segments = [(start, min(start + DAYS_PER_SEGMENT - 1, days)) for start in range(1, days + 1, DAYS_PER_SEGMENT)]
+    ranges = "\n".join(f"- Week {i + 1}: days {start}-{end}" for i, (start, end) in enumerate(segments))
+    prompt = f"""
+    You are an elite AI Study Coach. The user wants to learn the following topic: "{goal}"
+    They have exactly {days} days, split into these weeks:
+    {ranges}
+
+    Outline the roadmap: give each week ONE theme so that the weeks build on each other logically,
+    from foundations to mastery.
+
+    Output ONLY valid JSON with EXACTLY {len(segments)} weeks:
+    {{"weeks": [{{"week": 1, "theme": "Short title", "summary": "1 sentence on what this week covers"}}]}}
+    """
+    raw_response = await groq.generate_study_material(
+        prompt,
+        model=groq.GROQ_MODEL_SMART,
+        max_tokens=80 * len(segments) + 200
+    )
+    weeks = json.loads(raw_response).get("weeks", [])
+    if len(weeks) < len(segments):
+        raise ValueError(f"Outline has {len(weeks)} weeks, expected {len(segments)}.")
+
+    return [
+        {"week": i + 1, "theme": week.get("theme", ""), "summary": week.get("summary", ""), "start_day": start, "end_day": end}
+        for i, (week, (start, end)) in enumerate(zip(weeks, segments))
+    ]
+
+async def _generate_week(goal: str, days: int, outline: list[dict], week: dict) -> list[dict]:
+    """The day entries of one week of the outline."""
+    themes = "\n".join(f"- Week {w['week']} (days {w['start_day']}-{w['end_day']}): {w['theme']}" for w in outline)
+    count = week["end_day"] - week["start_day"] + 1
+    prompt = f"""
+    You are an elite AI Study Coach building a {days}-day roadmap to learn "{goal}".
+    The full plan is:
+    {themes}
+
+    Write the days of Week {week['week']} only: "{week['theme']}" ({week['summary']}).
+    Cover days {week['start_day']} to {week['end_day']}, building on the previous weeks and preparing for the next.
+
+    Output ONLY valid JSON with EXACTLY {count} objects in the "days" array:
+    {{
+        "days": [
+            {{
+                "day": {week['start_day']},
+                "topic": "Title of the day's focus",
+                "description": "Short 1-2 sentence explanation of what to study"
+            }}
+        ]
+    }}
+    """
+    for attempt in range(2):
+        raw_response = await groq.generate_study_material(
+            prompt,
+            model=groq.GROQ_MODEL_SMART,
+            max_tokens=100 * count + 200,
+            cache=attempt == 0
+        )
+        week_days = json.loads(raw_response).get("days", [])
+        if len(week_days) >= count:
+            break
+    else:
+        raise ValueError(f"Week {week['week']} returned {len(week_days)} days, expected {count}.")
+
+    # Day numbers come from the outline, not the model
+    return [
+        {"day": week["start_day"] + i, "topic": d.get("topic", ""), "description": d.get("description", ""), "completed": False}
+        for i, d in enumerate(week_days[:count])
+    ]
+
+async def _generate_segmented_roadmap(goal: str, days: int) -> dict:
+    outline = await _generate_outline(goal, days)
+    # Weeks are independent once the outline exists; the Groq limiter paces the parallel calls
+    weeks = await asyncio.gather(*(_generate_week(goal, days, outline, week) for week in outline))
+    return {
+        "weeks": [{"week": w["week"], "theme": w["theme"], "summary": w["summary"]} for w in outline],
+        "days": [day for week_days in weeks for day in week_days],
+    }
+
 @router.post("/generate")
 async def generate_learning_path(req: PathRequest):
     try:
@@ -17,49 +143,11 @@ async def generate_learning_path(req: PathRequest):
         if not await deduct_credit():
             raise HTTPException(status_code=402, detail="Insufficient credits.")
 
-        # 2. Prompt Groq for the study plan
-        prompt = f"""
-        You are an elite AI Study Coach. The user wants to learn the following topic: "{req.goal}"
-        They have exactly {req.days} days to achieve this goal.
-        
-        Create a detailed, day-by-day learning roadmap. 
-        Break the topic down into logical progressions.
-        
-        CRITICAL OUTPUT INSTRUCTIONS:
-        1. You must output ONLY valid JSON. 
-        2. You MUST generate EXACTLY {req.days} objects in the "days" array. Do not stop at 10 or 15 days.
-        3. Even if the topic is simple, spread it across the full {req.days} days.
-        
-        JSON Structure:
-        {{
-            "days": [
-                {{
-                    "day": 1,
-                    "topic": "Title of the day's focus",
-                    "description": "Short 1-2 sentence explanation of what to study",
-                    "completed": false
-                }},
-                ... (continue for all {req.days} days)
-            ]
-        }}
-        """
-
-        # Using the Smart model for short paths, and Fast model for long paths to prevent timeouts
-        # The 8B model is much faster and more reliable for large JSON responses on the free tier.
-        target_model = groq.GROQ_MODEL_SMART if req.days <= 14 else groq.GROQ_MODEL_FAST
-        max_t = 3000 if req.days > 14 else 1500
-
-        raw_response = await groq.generate_study_material(
-            prompt, 
-            model=target_model, 
-            max_tokens=max_t
-        )
-        roadmap_data = json.loads(raw_response)
-
-        # Ensure the 'completed' field exists and is false
-        if "days" in roadmap_data:
-            for day in roadmap_data["days"]:
-                day["completed"] = False
+        # 2. Prompt Groq for the study plan (long plans are generated week by week in parallel)
+        if req.days > SEGMENT_THRESHOLD_DAYS:
+            roadmap_data = await _generate_segmented_roadmap(req.goal, req.days)
+        else:
+            roadmap_data = await _generate_single_roadmap(req.goal, req.days)
 
         # 3. Save to Supabase
         db_res = supabase_client.table("learning_paths").insert({
@@ -96,34 +184,44 @@ class CompleteDayRequest(BaseModel):
     day: int
     completed: bool
 
+class CompleteDaysRequest(BaseModel):
+    days: list[int]
+    completed: bool
+
+def _set_days_completed(path_id: str, days: list[int], completed: bool) -> int:
+    """Updates the days in a single atomic statement; returns how many of them exist in the roadmap."""
+    rpc_res = supabase_client.rpc(
+        "set_learning_path_days",
+        {"path_id": path_id, "day_numbers": days, "is_completed": completed}
+    ).execute()
+    if rpc_res.data is None:
+        raise HTTPException(status_code=404, detail="Learning path not found.")
+    return rpc_res.data
+
 @router.put("/{path_id}/complete")
 async def update_day_status(path_id: str, req: CompleteDayRequest):
     try:
-        # 1. Fetch current roadmap
-        db_res = supabase_client.table("learning_paths").select("roadmap").eq("id", path_id).single().execute()
-        if not db_res.data:
-            raise HTTPException(status_code=404, detail="Learning path not found.")
-        
-        roadmap = db_res.data["roadmap"]
-        
-        # 2. Update the specific day
-        updated = False
-        if "days" in roadmap:
-            for d in roadmap["days"]:
-                if d.get("day") == req.day:
-                    d["completed"] = req.completed
-                    updated = True
-                    break
-                    
-        if not updated:
+        if not _set_days_completed(path_id, [req.day], req.completed):
             raise HTTPException(status_code=400, detail=f"Day {req.day} not found in roadmap.")
-            
-        # 3. Save back to DB
-        update_res = supabase_client.table("learning_paths").update({
-            "roadmap": roadmap
-        }).eq("id", path_id).execute()
         
-        return {"status": "success", "roadmap": roadmap}
+        return {"status": "success", "day": req.day, "completed": req.completed}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{path_id}/complete/bulk")
+async def update_days_status(path_id: str, req: CompleteDaysRequest):
+    """Marks several days completed (or not) in one call."""
+    try:
+        if not req.days:
+            raise HTTPException(status_code=400, detail="No days given.")
         
+        updated = _set_days_completed(path_id, sorted(set(req.days)), req.completed)
+        return {"status": "success", "updated": updated, "completed": req.completed}
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
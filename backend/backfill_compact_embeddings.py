@@ -0,0 +1,33 @@
+"""
+Fills document_chunks.embedding_short for chunks stored before EMBEDDING_STORAGE=compact
+(run supabase/schema_compact_embeddings.sql first).
+
+Run from the backend directory:
+    python backfill_compact_embeddings.py [--batch-size 5000]
+"""
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+from services.supabase_client import supabase_client
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    total = 0
+    start = time.perf_counter()
+    while True:
+        res = supabase_client.rpc("backfill_embedding_short", {"batch_size": args.batch_size}).execute()
+        updated = res.data or 0
+        if not updated:
+            break
+        total += updated
+        print(f"Backfilled {total} chunks ({time.perf_counter() - start:.0f}s)")
+    print(f"Done: {total} chunks backfilled.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: the original chunk_text (fresh encoder per call, one decode per window)
+against StreamingChunker on a ~1M-token text.
+
+Run from the backend directory:
+    python benchmarks/chunking_bench.py [--tokens 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken
+from services.chunking import StreamingChunker, get_encoder
+
+def legacy_chunk_text(text: str, chunk_size: int = 700, chunk_overlap: int = 100) -> list[str]:
+    """The chunker as it was before StreamingChunker, kept verbatim for comparison."""
+    encoder = tiktoken.get_encoding("cl100k_base")
+    tokens = encoder.encode(text)
+    
+    chunks = []
+    
+    start_idx = 0
+    while start_idx < len(tokens):
+        end_idx = min(start_idx + chunk_size, len(tokens))
+        chunk_tokens = tokens[start_idx:end_idx]
+        chunk_text = encoder.decode(chunk_tokens)
+        chunks.append(chunk_text)
+        
+        # Advance by chunk_size - chunk_overlap
+        if end_idx == len(tokens):
+            break
+        start_idx += (chunk_size - chunk_overlap)
+        
+    return chunks
+
+def new_chunk_text(text: str, chunk_size: int = 700, chunk_overlap: int = 100) -> list[dict]:
+    chunker = StreamingChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return chunker.feed(text) + chunker.flush()
+
+def build_text(target_tokens: int) -> str:
+    """Deterministic lecture-like text with some non-ASCII, grown until it reaches target_tokens."""
+    rng = random.Random(42)
+    vocab = [
+        "the", "gradient", "descent", "matrix", "eigenvalue", "theorem", "proof", "function",
+        "derivative", "integral", "probability", "distribution", "network", "layer", "loss",
+        "café", "naïve", "Schrödinger", "μ", "σ²", "→", "≤", "x_1", "f(x)", "42", "3.14",
+    ]
+    encoder = get_encoder()
+    parts = []
+    tokens = 0
+    while tokens < target_tokens:
+        sentence = " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 20))).capitalize() + ". "
+        paragraph = "".join(sentence for _ in range(5)) + "\n\n"
+        parts.append(paragraph * 200)
+        tokens += len(encoder.encode_ordinary(parts[-1]))
+    return "".join(parts)
+
+def best_of(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = build_text(args.tokens)
+    print(f"Text: {len(text):,} chars, {len(get_encoder().encode_ordinary(text)):,} tokens")
+
+    legacy_s, legacy = best_of(lambda: legacy_chunk_text(text), args.repeat)
+    new_s, new = best_of(lambda: new_chunk_text(text), args.repeat)
+
+    same = sum(1 for a, b in zip(legacy, new) if a == b["content"])
+    print(f"legacy chunk_text:  {legacy_s * 1000:8.1f} ms  ({len(legacy)} chunks)")
+    print(f"StreamingChunker:   {new_s * 1000:8.1f} ms  ({len(new)} chunks)")
+    print(f"speedup:            {legacy_s / new_s:8.2f}x")
+    print(f"identical chunks:   {same}/{len(legacy)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Recall-vs-size report for the embedding storage modes: full float32 vectors against
+halfvec and int8 copies of the full vector or of a Matryoshka prefix, each measured
+alone and with the top candidates re-ranked by the full vectors (EMBEDDING_STORAGE=compact).
+
+Recall@k is measured against an exact float32 search. By default the corpus is synthetic,
+with per-dimension variance decaying like a Matryoshka-trained model's; --document runs
+on a stored document's real embeddings (needs the Supabase settings in .env).
+
+Run from the backend directory:
+    python benchmarks/embedding_storage_bench.py [--vectors 20000] [--candidates 50] [--document ID]
+"""
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIM = 768
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def synthetic_corpus(n: int, rng: np.random.Generator) -> np.ndarray:
+    """Clustered vectors whose leading dimensions carry most of the variance."""
+    scale = (np.arange(DIM) + 1.0) ** -0.5
+    centers = rng.standard_normal((max(1, n // 20), DIM)) * scale
+    return normalize(centers[rng.integers(0, len(centers), n)] + 0.7 * rng.standard_normal((n, DIM)) * scale).astype(np.float32)
+
+
+def document_corpus(document_id: str) -> np.ndarray:
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+    from services.vector_index import _fetch_chunk_rows
+    rows = [r for r in _fetch_chunk_rows(document_id) if r.get("embedding") is not None]
+    return normalize(np.array([r["embedding"] for r in rows], dtype=np.float32))
+
+
+def encode(corpus: np.ndarray, dim: int, dtype: str) -> tuple[np.ndarray, int]:
+    """The stored form of each vector (dequantized for scoring) and its size in bytes."""
+    prefix = normalize(corpus[:, :dim])
+    if dtype == "halfvec":
+        return prefix.astype(np.float16).astype(np.float32), 2 * dim
+    scales = np.abs(prefix).max(axis=1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(prefix / scales) * scales, dim + 4  # int8 values plus a float32 scale
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[-1])
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+    return np.take_along_axis(top, order, axis=-1)
+
+
+def recall(expected: np.ndarray, found: np.ndarray) -> float:
+    return float(np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--document", help="use this document's stored chunk embeddings instead of synthetic ones")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    corpus = document_corpus(args.document) if args.document else synthetic_corpus(args.vectors, rng)
+    # Queries paraphrase corpus vectors
+    picked = corpus[rng.integers(0, len(corpus), args.queries)]
+    queries = normalize(picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32) * np.abs(picked).mean())
+    expected = top_k(queries @ corpus.T, args.k)
+
+    print(f"{len(corpus):,} vectors, {args.queries} queries, recall@{args.k}, re-rank of top {args.candidates} with full vectors")
+    print(f"{'storage':<22}{'bytes/vec':>10}{'vs full':>9}{'recall':>9}{'re-ranked':>11}")
+    print(f"{'vector(768) float32':<22}{4 * DIM:>10}{1.0:>8.1f}x{1.0:>9.3f}{'-':>11}")
+    for dtype in ("halfvec", "int8"):
+        for dim in (768, 512, 256, 128):
+            stored, size = encode(corpus, dim, dtype)
+            scores = normalize(queries[:, :dim]) @ stored.T
+            found = top_k(scores, args.k)
+            candidates = top_k(scores, args.candidates)
+            exact = np.einsum("qd,qcd->qc", queries, corpus[candidates])
+            reranked = np.take_along_axis(candidates, top_k(exact, args.k), axis=-1)
+            print(f"{f'{dtype}({dim})':<22}{size:>10}{4 * DIM / size:>8.1f}x{recall(expected, found):>9.3f}{recall(expected, reranked):>11.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: library-wide search over every chunk (match_document_chunks_global) against
+the two-stage search (match_document_chunks_two_stage: top-N documents by centroid,
+then only their chunks), on a synthetic library of topic-clustered embeddings.
+
+Both strategies are reproduced in numpy with exact scans, so the numbers compare the
+amount of work each does rather than Postgres plans; recall@k is measured against the
+full scan.
+
+Run from the backend directory:
+    python benchmarks/global_search_bench.py [--docs 10000 100000] [--chunks-per-doc 8] [--candidates 20] [--dim 64]
+"""
+import argparse
+import time
+import numpy as np
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+def build_library(docs: int, chunks_per_doc: int, dim: int, rng: np.random.Generator):
+    """Documents share topics (about 50 documents per topic) and chunks scatter around their document."""
+    topics = normalize(rng.standard_normal((max(1, docs // 50), dim), dtype=np.float32))
+    doc_centers = normalize(topics[rng.integers(0, len(topics), docs)] + 0.6 * normalize(rng.standard_normal((docs, dim), dtype=np.float32)))
+    counts = rng.integers(max(1, chunks_per_doc // 2), chunks_per_doc * 3 // 2 + 1, docs)
+    owners = np.repeat(np.arange(docs), counts)
+    chunks = normalize(doc_centers[owners] + 0.9 * normalize(rng.standard_normal((len(owners), dim), dtype=np.float32)))
+
+    # Centroids as ingestion stores them: normalized mean of the normalized chunk embeddings
+    sums = np.zeros((docs, dim), dtype=np.float32)
+    np.add.at(sums, owners, chunks)
+    centroids = normalize(sums)
+
+    # Chunk rows grouped by document, as the document_id index returns them
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    return chunks, owners, centroids, starts
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def full_scan(query: np.ndarray, chunks: np.ndarray, k: int) -> np.ndarray:
+    return top_k(chunks @ query, k)
+
+
+def two_stage(query: np.ndarray, chunks: np.ndarray, centroids: np.ndarray, starts: np.ndarray, candidates: int, k: int) -> np.ndarray:
+    documents = top_k(centroids @ query, candidates)
+    rows = np.concatenate([np.arange(starts[d], starts[d + 1]) for d in documents])
+    return rows[top_k(chunks[rows] @ query, k)]
+
+
+def run(docs: int, args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(42)
+    chunks, owners, centroids, starts = build_library(docs, args.chunks_per_doc, args.dim, rng)
+    # Queries paraphrase a random chunk of the library
+    picked = rng.integers(0, len(chunks), args.queries)
+    queries = normalize(chunks[picked] + 0.5 * normalize(rng.standard_normal((args.queries, args.dim), dtype=np.float32)))
+
+    full_ms, staged_ms, recall, hit = [], [], 0.0, 0
+    for query, source in zip(queries, picked):
+        start = time.perf_counter()
+        expected = full_scan(query, chunks, args.k)
+        full_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        found = two_stage(query, chunks, centroids, starts, args.candidates, args.k)
+        staged_ms.append((time.perf_counter() - start) * 1000)
+
+        recall += len(set(expected) & set(found)) / len(expected)
+        hit += owners[source] in set(owners[found])
+
+    print(f"{docs:,} documents, {len(chunks):,} chunks, dim {args.dim}, top {args.k} from {args.candidates} candidate documents")
+    print(f"  full scan:   p50 {np.median(full_ms):7.2f} ms   p95 {np.percentile(full_ms, 95):7.2f} ms")
+    print(f"  two-stage:   p50 {np.median(staged_ms):7.2f} ms   p95 {np.percentile(staged_ms, 95):7.2f} ms")
+    print(f"  speedup:     {np.median(full_ms) / np.median(staged_ms):7.2f}x")
+    print(f"  recall@{args.k}:   {recall / args.queries:7.3f}")
+    print(f"  source document found: {hit / args.queries:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--chunks-per-doc", type=int, default=8)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    for docs in args.docs:
+        run(docs, args)
+
+if __name__ == "__main__":
+    main()
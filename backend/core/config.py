@@ -7,6 +7,73 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     CORS_ORIGINS: list[str] = ["*"]  # Allow all origins for Vercel connection
+
+    # Embedding throughput: chunks per embed_content call and max batches in flight
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+    # Provider quotas enforced by the shared rate limiters (per Groq model / for Gemini embeddings)
+    GROQ_RPM: int = int(os.getenv("GROQ_RPM", "30"))
+    GROQ_TPM: int = int(os.getenv("GROQ_TPM", "6000"))
+    GEMINI_EMBED_RPM: int = int(os.getenv("GEMINI_EMBED_RPM", "100"))
+    GEMINI_EMBED_TPM: int = int(os.getenv("GEMINI_EMBED_TPM", "30000"))
+
+    # Local working directory for job workspaces and caches
+    DATA_DIR: str = os.getenv("DATA_DIR", "data")
+
+    # Embedding cache: in-process LRU in front of an on-disk store under DATA_DIR/cache
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+    EMBEDDING_CACHE_MAX_MB: int = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+    EMBEDDING_CACHE_DTYPE: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")  # or "float32"
+
+    # Prompt context budgets (tokens of document text) per Groq model
+    CONTEXT_BUDGET_FAST: int = int(os.getenv("CONTEXT_BUDGET_FAST", "3000"))
+    CONTEXT_BUDGET_SMART: int = int(os.getenv("CONTEXT_BUDGET_SMART", "6000"))
+
+    # Chunk retrieval: "rpc" (pgvector in Supabase) or "local" (in-process per-document index under DATA_DIR/vectors)
+    RETRIEVAL_BACKEND: str = os.getenv("RETRIEVAL_BACKEND", "rpc")
+    VECTOR_INDEX_DTYPE: str = os.getenv("VECTOR_INDEX_DTYPE", "int8")  # or "float16"
+    VECTOR_INDEX_MAX_DOCUMENTS: int = int(os.getenv("VECTOR_INDEX_MAX_DOCUMENTS", "64"))
+    # Embedding storage: "full" searches the 768-dim vectors; "compact" searches a normalized EMBEDDING_PREFIX_DIM-dim
+    # prefix (halfvec in Postgres, int8 in the local index) and re-ranks the top candidates with the full vectors
+    EMBEDDING_STORAGE: str = os.getenv("EMBEDDING_STORAGE", "full")
+    EMBEDDING_PREFIX_DIM: int = int(os.getenv("EMBEDDING_PREFIX_DIM", "256"))  # must match schema_compact_embeddings.sql
+    EMBEDDING_RERANK_CANDIDATES: int = int(os.getenv("EMBEDDING_RERANK_CANDIDATES", "50"))
+    # Library-wide search: pick this many documents by centroid first, then rank only their chunks (0 = rank every chunk);
+    # applies in both storage modes
+    GLOBAL_SEARCH_CANDIDATE_DOCUMENTS: int = int(os.getenv("GLOBAL_SEARCH_CANDIDATE_DOCUMENTS", "20"))
+    # Fuse vector matches with BM25 matches (reciprocal-rank fusion)
+    RETRIEVAL_HYBRID: bool = os.getenv("RETRIEVAL_HYBRID", "true").lower() == "true"
+    LEXICAL_INDEX_MAX_DOCUMENTS: int = int(os.getenv("LEXICAL_INDEX_MAX_DOCUMENTS", "64"))
+
+    # Chat retrieval cache: a query within QUERY_CACHE_SIMILARITY (cosine) of a recent one on the same document reuses its chunks
+    QUERY_CACHE_ENABLED: bool = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_SIMILARITY: float = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.95"))
+    QUERY_CACHE_TTL_SECONDS: int = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "1800"))
+    QUERY_CACHE_MAX_ENTRIES: int = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "64"))  # per document
+
+    # LLM response cache (opt-in): identical generation requests reuse the stored completion
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))  # 7 days
+    LLM_CACHE_MAX_MB: int = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+    # Ingestion jobs
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_JOB_LEASE_SECONDS: int = int(os.getenv("INGEST_JOB_LEASE_SECONDS", "300"))
+    INGEST_GENERATE_SUMMARY: bool = os.getenv("INGEST_GENERATE_SUMMARY", "false").lower() == "true"
+    # Pre-generate medium flashcards/quiz and the mind map after ingestion, at most this many documents per day
+    INGEST_PREWARM: bool = os.getenv("INGEST_PREWARM", "false").lower() == "true"
+    PREWARM_DAILY_LIMIT: int = int(os.getenv("PREWARM_DAILY_LIMIT", "50"))
+
+    # Master summary map-reduce: calls in flight and input tokens per reduce call
+    SUMMARY_MAX_CONCURRENCY: int = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8"))
+    SUMMARY_REDUCE_INPUT_TOKENS: int = int(os.getenv("SUMMARY_REDUCE_INPUT_TOKENS", "4000"))
+
+    # PDFs with at least this many pages are extracted by a process pool (0 disables the pool)
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "200"))
+    PDF_PROCESS_WORKERS: int = int(os.getenv("PDF_PROCESS_WORKERS", "0"))  # 0 = one per CPU
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
     
     class Config:
         env_file = ".env"
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from core.config import settings
 from api.routes import upload, generate, chat, user, quiz_tracking, library, path
+from services import ingestion
 
 app = FastAPI(
     title="AI Learning Assistant API",
@@ -18,6 +19,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_ingestion_workers():
+    await ingestion.start_workers()
+
+@app.on_event("shutdown")
+async def stop_ingestion_workers():
+    await ingestion.stop_workers()
+
 # Include Routers
 app.include_router(upload.router, prefix="/api/upload", tags=["Upload"])
 app.include_router(generate.router, prefix="/api/generate", tags=["Generate"])
@@ -33,7 +42,17 @@ def health_check():
     from services.gemini_client import get_embedding
     src = inspect.getsource(get_embedding)
     import sys
-    return {"status": "healthy", "src": src, "modules": list(sys.modules.keys())[:10]}
+    from services.embedding_cache import embedding_cache
+    from services.llm_cache import llm_cache
+    from services.query_cache import query_cache
+    return {
+        "status": "healthy",
+        "src": src,
+        "modules": list(sys.modules.keys())[:10],
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "query_cache": query_cache.stats() if query_cache else None
+    }
 
 if __name__ == "__main__":
     import uvicorn
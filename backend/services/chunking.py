@@ -1,24 +1,175 @@
+from bisect import bisect_right
+from functools import lru_cache
 import tiktoken
 
+# UTF-8 continuation bytes; every other byte starts a character
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+@lru_cache(maxsize=None)
+def get_encoder(name: str = "cl100k_base") -> tiktoken.Encoding:
+    """Returns the shared tiktoken encoder (built once per process)."""
+    return tiktoken.get_encoding(name)
+
+def _char_count(data: bytes) -> int:
+    """Number of characters that start within a UTF-8 byte string."""
+    return len(data.translate(None, _CONTINUATION_BYTES))
+
+class _Piece:
+    """A fed piece of text with its global byte/char position and source metadata."""
+    __slots__ = ("byte_start", "char_start", "data", "meta", "_mark_bytes", "_mark_chars")
+
+    def __init__(self, byte_start: int, char_start: int, text: str, data: bytes, meta: dict):
+        self.byte_start = byte_start
+        self.char_start = char_start
+        # Only needed to map byte offsets to characters when the piece is not plain ASCII
+        self.data = None if len(data) == len(text) else data
+        self.meta = meta
+        # Byte -> char checkpoints, so successive lookups only count the bytes in between
+        self._mark_bytes = [0]
+        self._mark_chars = [0]
+
+    def char_at(self, byte_offset: int) -> int:
+        """Global char offset for a global byte offset inside this piece (mid-character rounds up)."""
+        local = byte_offset - self.byte_start
+        if self.data is None:
+            return self.char_start + local
+        i = bisect_right(self._mark_bytes, local) - 1
+        chars = self._mark_chars[i] + _char_count(self.data[self._mark_bytes[i]:local])
+        self._mark_bytes.insert(i + 1, local)
+        self._mark_chars.insert(i + 1, chars)
+        return self.char_start + chars
+
+class StreamingChunker:
+    """
+    Incremental token chunker: feed text pieces (PDF pages, transcript snippets) as they
+    arrive and get back every chunk that is complete so far.
+
+    Each piece is encoded once. Token windows are mapped back to character offsets through
+    their byte lengths, and chunk text is sliced from the source instead of decoding the
+    window, so overlapping tokens are never decoded twice. Only the text of
+    the current window is held, so memory does not grow with the document.
+
+    Chunks are returned as {"content": str, "metadata": dict}. The metadata always carries
+    char_start/char_end (offsets into the pieces joined by `separator`); pieces fed with a
+    page number add page_start/page_end, pieces fed with a time range add
+    time_start/time_end (seconds).
+    """
+
+    def __init__(self, chunk_size: int = 700, chunk_overlap: int = 100, separator: str = " "):
+        self.encoder = get_encoder()
+        self.chunk_size = chunk_size
+        self.step = chunk_size - chunk_overlap
+        self.chunk_overlap = chunk_overlap
+        self.separator = separator
+        # Buffered tokens; those before _head are consumed, and _head_byte is where _head starts
+        self._tokens: list[int] = []
+        self._head = 0
+        self._head_byte = 0
+        self._pieces: list[_Piece] = []
+        self._piece_starts: list[int] = []
+        self._text = ""
+        self._text_start = 0
+        self._next_byte = 0
+        self._next_char = 0
+        self._emitted = False
+
+    def feed(self, text: str, page: int | None = None, time_range: tuple[float, float] | None = None) -> list[dict]:
+        """Adds the next piece of text and returns the chunks it completed."""
+        piece_text = self.separator + text if self._next_char else text
+        try:
+            data = piece_text.encode("utf-8")
+        except UnicodeEncodeError:
+            # Lone surrogates from PDF extraction: replace them so bytes and tokens line up
+            piece_text = piece_text.encode("utf-8", "replace").decode("utf-8")
+            data = piece_text.encode("utf-8")
+        if not data:
+            return []
+
+        meta = {}
+        if page is not None:
+            meta["page"] = page
+        if time_range is not None:
+            meta["time"] = time_range
+        self._pieces.append(_Piece(self._next_byte, self._next_char, piece_text, data, meta))
+        self._piece_starts.append(self._next_byte)
+        self._text += piece_text
+        self._tokens.extend(self.encoder.encode_ordinary(piece_text))
+        self._next_byte += len(data)
+        self._next_char += len(piece_text)
+
+        chunks = []
+        # A full window is only final once tokens exist beyond it; otherwise it may be the last one
+        while self._buffered() > self.chunk_size:
+            head = self._head
+            # Only byte lengths are needed: the step and the overlap are each measured once,
+            # and the chunk text itself is sliced from the source
+            step_bytes = len(self.encoder.decode_bytes(self._tokens[head:head + self.step]))
+            overlap_bytes = len(self.encoder.decode_bytes(self._tokens[head + self.step:head + self.chunk_size]))
+            chunks.append(self._make_chunk(self._head_byte + step_bytes + overlap_bytes))
+            # Advance by chunk_size - chunk_overlap
+            self._advance(self.step, step_bytes)
+        return chunks
+
+    def flush(self) -> list[dict]:
+        """Returns the final chunk, if any tokens have not been covered yet."""
+        # After a chunk, the first chunk_overlap tokens left are already part of it
+        if self._buffered() > (self.chunk_overlap if self._emitted else 0):
+            chunk = self._make_chunk(self._next_byte)
+            self._advance(self._buffered(), self._next_byte - self._head_byte)
+            return [chunk]
+        return []
+
+    def _buffered(self) -> int:
+        return len(self._tokens) - self._head
+
+    def _piece_at(self, byte_offset: int) -> int:
+        return max(bisect_right(self._piece_starts, byte_offset) - 1, 0)
+
+    def _char_at(self, byte_offset: int) -> int:
+        if byte_offset >= self._next_byte:
+            return self._next_char
+        return self._pieces[self._piece_at(byte_offset)].char_at(byte_offset)
+
+    def _make_chunk(self, byte_end: int) -> dict:
+        """Builds the chunk for the bytes [_head_byte, byte_end)."""
+        self._emitted = True
+        byte_start = self._head_byte
+        char_start, char_end = self._char_at(byte_start), self._char_at(byte_end)
+
+        metadata = {"char_start": char_start, "char_end": char_end}
+        covered = self._pieces[self._piece_at(byte_start):self._piece_at(max(byte_end - 1, byte_start)) + 1]
+        pages = [p.meta["page"] for p in covered if "page" in p.meta]
+        if pages:
+            metadata["page_start"], metadata["page_end"] = pages[0], pages[-1]
+        times = [p.meta["time"] for p in covered if "time" in p.meta]
+        if times:
+            metadata["time_start"], metadata["time_end"] = times[0][0], times[-1][1]
+
+        content = self._text[char_start - self._text_start:char_end - self._text_start]
+        return {"content": content, "metadata": metadata}
+
+    def _advance(self, count: int, byte_count: int) -> None:
+        """Consumes `count` tokens spanning `byte_count` bytes and releases what no future window needs."""
+        self._head += count
+        self._head_byte += byte_count
+
+        # Compact buffers only once the consumed prefix dominates them, so advancing stays O(window)
+        if self._head > 4096 and self._head * 2 > len(self._tokens):
+            del self._tokens[:self._head]
+            self._head = 0
+
+        first = self._piece_at(self._head_byte)
+        if first:
+            del self._pieces[:first]
+            del self._piece_starts[:first]
+        consumed = self._char_at(self._head_byte) - self._text_start
+        if consumed * 2 > len(self._text):
+            self._text = self._text[consumed:]
+            self._text_start += consumed
+
 def chunk_text(text: str, chunk_size: int = 700, chunk_overlap: int = 100) -> list[str]:
     """
     Chunks text using tiktoken to count exact tokens (cl100k_base used for text-embedding-3-small).
     """
-    encoder = tiktoken.get_encoding("cl100k_base")
-    tokens = encoder.encode(text)
-    
-    chunks = []
-    
-    start_idx = 0
-    while start_idx < len(tokens):
-        end_idx = min(start_idx + chunk_size, len(tokens))
-        chunk_tokens = tokens[start_idx:end_idx]
-        chunk_text = encoder.decode(chunk_tokens)
-        chunks.append(chunk_text)
-        
-        # Advance by chunk_size - chunk_overlap
-        if end_idx == len(tokens):
-            break
-        start_idx += (chunk_size - chunk_overlap)
-        
-    return chunks
+    chunker = StreamingChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [chunk["content"] for chunk in chunker.feed(text) + chunker.flush()]
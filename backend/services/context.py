@@ -0,0 +1,134 @@
+"""
+Token-budget context packing for LLM prompts.
+
+Chunks are taken in rank order until the model's context budget is full. Neighbouring
+chunks share a 100-token overlap, so when two selected chunks of the same document
+overlap (known from their char_start/char_end metadata) the shared text is included
+only once, and contiguous pieces are stitched back together in document order.
+"""
+from typing import NamedTuple
+from core.config import settings
+from services.chunking import get_encoder
+from services.groq_client import GROQ_MODEL_FAST, GROQ_MODEL_SMART
+
+SEPARATOR = "\n\n"
+
+# Ingestion chunks are 700 tokens with a 100-token overlap
+CHUNK_TOKENS = 700
+CHUNK_STEP_TOKENS = 600
+
+MODEL_CONTEXT_BUDGETS = {
+    GROQ_MODEL_FAST: settings.CONTEXT_BUDGET_FAST,
+    GROQ_MODEL_SMART: settings.CONTEXT_BUDGET_SMART,
+}
+
+
+class PackedContext(NamedTuple):
+    text: str
+    chunks: int  # chunks that contributed to `text`
+
+
+def context_budget(model: str) -> int:
+    return MODEL_CONTEXT_BUDGETS.get(model, settings.CONTEXT_BUDGET_FAST)
+
+
+def chunks_for_budget(budget: int) -> int:
+    """How many consecutive chunks it takes to fill `budget` tokens (for sizing fetches)."""
+    return max(1, (budget - CHUNK_TOKENS) // CHUNK_STEP_TOKENS + 2)
+
+
+def _span(chunk: dict, content: str) -> tuple[int, int] | None:
+    metadata = chunk.get("metadata") or {}
+    start, end = metadata.get("char_start"), metadata.get("char_end")
+    # Chunks stored before offsets were recorded (or not matching their text) are used whole
+    if start is None or end is None or end - start != len(content):
+        return None
+    return start, end
+
+
+def _subtract(span: tuple[int, int], taken: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Parts of `span` not covered by any of the `taken` spans."""
+    parts = [span]
+    for t_start, t_end in taken:
+        remaining = []
+        for start, end in parts:
+            if t_end <= start or t_start >= end:
+                remaining.append((start, end))
+                continue
+            if start < t_start:
+                remaining.append((start, t_start))
+            if t_end < end:
+                remaining.append((t_end, end))
+        parts = remaining
+    return parts
+
+
+def pack_chunks(chunks: list[dict], budget: int, separator: str = SEPARATOR) -> PackedContext:
+    """
+    Packs ranked chunks ({"content", "metadata", optional "document_id"}) into at most
+    `budget` tokens. Chunks that do not fit are skipped in favour of later, smaller ones;
+    only a first chunk that alone exceeds the budget is cut (at a token boundary).
+    """
+    encoder = get_encoder()
+    separator_tokens = len(encoder.encode_ordinary(separator))
+    used = 0
+    # (document key, start, end, text, has offsets) per selected piece; chunks without
+    # offsets use their rank as position, so they keep rank order and are never stitched
+    pieces: list[tuple[str, int, int, str, bool]] = []
+    taken: dict[str, list[tuple[int, int]]] = {}
+    doc_rank: dict[str, int] = {}
+    contributing = 0
+
+    for rank, chunk in enumerate(chunks):
+        content = chunk.get("content") or ""
+        doc = str(chunk.get("document_id", ""))
+        span = _span(chunk, content)
+        if span is None:
+            candidates = [(rank, content)]
+        else:
+            start = span[0]
+            candidates = [(s, content[s - start:e - start]) for s, e in _subtract(span, taken.get(doc, []))]
+        candidates = [(pos, text) for pos, text in candidates if text.strip()]
+        if not candidates:
+            continue
+
+        cost = sum(len(encoder.encode_ordinary(text)) + separator_tokens for _, text in candidates)
+        if used + cost > budget:
+            if pieces:
+                continue
+            # Nothing selected yet and the best chunk alone is too big: keep its head
+            tokens = encoder.encode_ordinary(candidates[0][1])[:max(budget - separator_tokens, 0)]
+            if not tokens:
+                # No room for even one token: nothing contributes
+                break
+            candidates = [(candidates[0][0], encoder.decode(tokens))]
+            cost = budget
+
+        used += cost
+        contributing += 1
+        doc_rank.setdefault(doc, len(doc_rank))
+        for pos, text in candidates:
+            pieces.append((doc, pos, pos + len(text), text, span is not None))
+        if span is not None:
+            taken.setdefault(doc, []).extend((pos, pos + len(text)) for pos, text in candidates)
+        if used >= budget:
+            break
+
+    # Document order within each document, so contiguous pieces read as the original text
+    pieces.sort(key=lambda p: (doc_rank[p[0]], p[1]))
+    parts: list[str] = []
+    previous = None
+    for doc, start, end, text, has_offsets in pieces:
+        if has_offsets and previous == (doc, start):
+            parts[-1] += text
+        else:
+            parts.append(text)
+        previous = (doc, end) if has_offsets else None
+
+    return PackedContext(separator.join(parts), contributing)
+
+
+def pack_for_model(chunks: list[dict], model: str, budget: int | None = None) -> PackedContext:
+    """pack_chunks with the model's context budget (or a smaller explicit one)."""
+    limit = context_budget(model)
+    return pack_chunks(chunks, min(budget, limit) if budget else limit)
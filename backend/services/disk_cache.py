@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+
+class DiskCache:
+    """
+    Small persistent key-value store backed by SQLite.
+    Values are bytes. Entries can carry a TTL, and once the stored values exceed
+    `max_bytes` the least recently read entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at_idx ON entries (accessed_at)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> bytes | None:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        """Returns the live entries among `keys` and marks them as recently used."""
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            # SQLite caps bound parameters per statement, so look keys up in slices
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM entries WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if expires_at is None or expires_at > now:
+                        found[key] = value
+                if found:
+                    self._conn.executemany(
+                        "UPDATE entries SET accessed_at = ? WHERE key = ?",
+                        [(now, key) for key in part if key in found]
+                    )
+        return found
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items: dict[str, bytes], ttl: float | None = None) -> None:
+        if not items:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for key, value in items.items():
+                    old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, value, len(value), expires_at, now)
+                    )
+                    self._total_bytes += len(value) - (old[0] if old else 0)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                raise
+            if self._total_bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # Expired entries go first, then least recently used until usage is back under 90% of the budget
+        rows = self._conn.execute("DELETE FROM entries WHERE expires_at <= ? RETURNING size", (now,)).fetchall()
+        self._total_bytes -= sum(size for (size,) in rows)
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT 32) RETURNING size"
+            ).fetchall()
+            if not rows:
+                break
+            self._total_bytes -= sum(size for (size,) in rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": count, "bytes": self._total_bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from core.config import settings
+from services.disk_cache import DiskCache
+
+# First byte of every stored value says how the floats are packed
+_FLOAT16 = b"h"
+_FLOAT32 = b"f"
+
+def _pack(values: list[float], dtype: str) -> bytes:
+    if dtype == "float16":
+        return _FLOAT16 + struct.pack(f"<{len(values)}e", *values)
+    return _FLOAT32 + array("f", values).tobytes()
+
+def _unpack(data: bytes) -> list[float]:
+    if data[:1] == _FLOAT16:
+        return list(struct.unpack(f"<{(len(data) - 1) // 2}e", data[1:]))
+    return array("f", data[1:]).tolist()
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU in front of an on-disk store.
+    Keys cover the model, the output dimensionality and a hash of the text, so changing
+    either setting never returns a stale vector.
+    """
+
+    def __init__(self, path: str, memory_items: int, max_disk_bytes: int, dtype: str = "float16"):
+        self.memory_items = memory_items
+        self.dtype = dtype
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = Lock()
+        self._disk = DiskCache(path, max_disk_bytes)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, dimensionality: int, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()
+        return f"{model}:{dimensionality}:{digest}"
+
+    def get_many(self, keys: list[str]) -> list[list[float] | None]:
+        results: list[list[float] | None] = [None] * len(keys)
+        disk_lookup = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.append(i)
+
+        if disk_lookup:
+            found = self._disk.get_many([keys[i] for i in disk_lookup])
+            promoted = {}
+            for i in disk_lookup:
+                data = found.get(keys[i])
+                if data is not None:
+                    results[i] = promoted[keys[i]] = _unpack(data)
+            with self._lock:
+                self.disk_hits += len(promoted)
+                self.misses += len(disk_lookup) - len(promoted)
+                for key, vector in promoted.items():
+                    self._remember(key, vector)
+        return results
+
+    def put_many(self, items: dict[str, list[float]]) -> None:
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        self._disk.set_many({key: _pack(vector, self.dtype) for key, vector in items.items()})
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk": self._disk.stats(),
+        }
+
+embedding_cache = EmbeddingCache(
+    os.path.join(settings.DATA_DIR, "cache", "embeddings.sqlite"),
+    memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+    max_disk_bytes=settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+    dtype=settings.EMBEDDING_CACHE_DTYPE,
+) if settings.EMBEDDING_CACHE_ENABLED else None
@@ -1,25 +1,126 @@
+import asyncio
 from google import genai
-from google.genai import types
+from google.genai import types, errors
 from core.config import settings
+from services.rate_limit import RateLimiter, parse_duration
+from services.embedding_cache import EmbeddingCache, embedding_cache
 
 # Use AsyncClient for non-blocking FastAPI integration
 client = genai.Client(api_key=settings.GEMINI_API_KEY, http_options={'api_version': 'v1beta'})
 
 GENERATIVE_MODEL = "models/gemini-2.0-flash"
 EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_DIM = 768
+
+# Shared quota for every embed_content call (ingestion batches and chat queries)
+embedding_limiter = RateLimiter("gemini:embed", settings.GEMINI_EMBED_RPM, settings.GEMINI_EMBED_TPM)
+RATE_LIMIT_RETRIES = 3
+
+def embedding_prefix(embedding: list[float], dim: int | None = None) -> list[float]:
+    """
+    The leading `dim` dimensions of an embedding, re-normalized. gemini-embedding-001 is
+    Matryoshka-trained, so the prefix is a usable lower-dimensional embedding on its own.
+    """
+    prefix = list(embedding[:dim or settings.EMBEDDING_PREFIX_DIM])
+    norm = sum(x * x for x in prefix) ** 0.5
+    return [x / norm for x in prefix] if norm else prefix
+
+def _cache_key(text: str) -> str:
+    return EmbeddingCache.key(EMBEDDING_MODEL, EMBEDDING_DIM, text)
+
+def _retry_delay(error: errors.APIError) -> float | None:
+    """Reads the RetryInfo delay Gemini attaches to 429 responses."""
+    details = (error.details or {}).get("error", {}).get("details", []) if isinstance(error.details, dict) else []
+    for detail in details:
+        if "retryDelay" in detail:
+            return parse_duration(detail["retryDelay"])
+    return None
+
+async def _embed_content(contents: str | list[str]):
+    """embed_content through the shared limiter, retrying 429s after Gemini's retry delay."""
+    texts = [contents] if isinstance(contents, str) else contents
+    # ~4 characters per token is close enough for quota accounting
+    tokens = sum(len(text) for text in texts) // 4 + 1
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await embedding_limiter.acquire(tokens)
+        try:
+            return await client.aio.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=contents,
+                config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIM)
+            )
+        except errors.APIError as e:
+            if e.code != 429 or attempt == RATE_LIMIT_RETRIES:
+                raise
+            print(f"Gemini embedding rate limited, retrying (attempt {attempt + 1})")
+            embedding_limiter.backoff(_retry_delay(e))
 
 async def get_embedding(text: str) -> list[float]:
-    """Generates an embedding for the given text."""
+    """Generates an embedding for the given text (served from the embedding cache when possible)."""
+    cache_key = _cache_key(text)
+    if embedding_cache:
+        cached = embedding_cache.get_many([cache_key])[0]
+        if cached is not None:
+            return cached
+
     # Note: genai.Client has both sync and async capabilities 
     # but for simple usage in FastAPI we just prefix with await if using AsyncClient
     # However, google-genai 0.1.0+ has genai.Client(..., http_options={'api_version': 'v1beta'}).aio
     
-    result = await client.aio.models.embed_content(
-        model=EMBEDDING_MODEL,
-        contents=text,
-        config=types.EmbedContentConfig(output_dimensionality=768)
+    result = await _embed_content(text)
+    embedding = result.embeddings[0].values
+    if embedding_cache:
+        embedding_cache.put_many({cache_key: embedding})
+    return embedding
+
+# Bounds how many batch requests are in flight at once across all uploads
+_embedding_semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+
+async def _embed_batch(texts: list[str]) -> list[list[float]]:
+    """Embeds a single batch of texts with one embed_content call."""
+    async with _embedding_semaphore:
+        result = await _embed_content(texts)
+    return [e.values for e in result.embeddings]
+
+async def get_embeddings_batch(
+    texts: list[str],
+    batch_size: int | None = None,
+    return_exceptions: bool = False
+) -> list[list[float] | None]:
+    """
+    Embeds many texts, sending `batch_size` texts per request with a bounded number
+    of requests in flight. Results keep the order of `texts`.
+    Cached and repeated texts are not sent; only the remaining misses are batched.
+    With return_exceptions=True a failed batch yields None for each of its texts
+    instead of failing the whole call.
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    keys = [_cache_key(text) for text in texts]
+    cached = embedding_cache.get_many(keys) if embedding_cache else [None] * len(texts)
+
+    # Each distinct uncached text is embedded once
+    pending: dict[str, str] = {}
+    for key, text, vector in zip(keys, texts, cached):
+        if vector is None and key not in pending:
+            pending[key] = text
+    pending_keys = list(pending)
+    batches = [pending_keys[i:i + batch_size] for i in range(0, len(pending_keys), batch_size)]
+
+    results = await asyncio.gather(
+        *[_embed_batch([pending[key] for key in batch]) for batch in batches],
+        return_exceptions=return_exceptions
     )
-    return result.embeddings[0].values
+
+    fresh: dict[str, list[float]] = {}
+    for batch_idx, (batch, result) in enumerate(zip(batches, results)):
+        if isinstance(result, BaseException):
+            print(f"Embedding batch {batch_idx} failed ({len(batch)} chunks skipped): {result}")
+        else:
+            fresh.update(zip(batch, result))
+    if embedding_cache and fresh:
+        embedding_cache.put_many(fresh)
+
+    return [vector if vector is not None else fresh.get(key) for key, vector in zip(keys, cached)]
 
 async def generate_study_material(prompt: str) -> str:
     """Generates study material (flashcards/quiz) using Gemini 2.0 Flash."""
@@ -1,5 +1,8 @@
-from groq import AsyncGroq
+from groq import AsyncGroq, RateLimitError
 from core.config import settings
+from services.chunking import get_encoder
+from services.rate_limit import RateLimiter, parse_duration
+from services.llm_cache import LLMCache, llm_cache
 
 if not settings.GROQ_API_KEY:
     print("Warning: GROQ_API_KEY is missing from environment variables.")
@@ -10,21 +13,81 @@ groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY, timeout=60.0)
 GROQ_MODEL_FAST = "llama-3.1-8b-instant"
 GROQ_MODEL_SMART = "llama-3.3-70b-versatile"
 
-async def generate_study_material(prompt: str, response_format: dict | None = {"type": "json_object"}, model: str = GROQ_MODEL_FAST, max_tokens: int = 700) -> str:
-    """Generates study material (flashcards/quiz) using Groq (Llama)."""
+# 429s are retried here, after waiting on the shared limiter, rather than by the SDK
+RATE_LIMIT_RETRIES = 3
+
+# Groq quotas are per model, so each model gets its own limiter
+_limiters: dict[str, RateLimiter] = {}
+
+def get_limiter(model: str) -> RateLimiter:
+    if model not in _limiters:
+        _limiters[model] = RateLimiter(f"groq:{model}", settings.GROQ_RPM, settings.GROQ_TPM)
+    return _limiters[model]
+
+def estimate_tokens(messages: list[dict], max_tokens: int | None) -> int:
+    """Prompt tokens (cl100k approximation of the Llama tokenizer) plus the completion budget."""
+    encoder = get_encoder()
+    prompt_tokens = sum(len(encoder.encode_ordinary(m["content"])) + 4 for m in messages)
+    return prompt_tokens + (max_tokens or 1024)
+
+async def create_chat_completion(**kwargs):
+    """
+    Calls chat.completions.create through the model's rate limiter.
+    Waits for quota before sending, re-syncs the limiter from Groq's rate-limit headers,
+    and retries 429s after the provider's retry-after. Works for stream=True as well.
+    """
+    limiter = get_limiter(kwargs["model"])
+    client = groq_client.with_options(max_retries=0)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        reserved = await limiter.acquire(estimate_tokens(kwargs["messages"], kwargs.get("max_tokens")))
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**kwargs)
+        except RateLimitError as e:
+            limiter.update_from_headers(e.response.headers)
+            limiter.backoff(parse_duration(e.response.headers.get("retry-after")))
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            print(f"Groq rate limited on {kwargs['model']}, retrying (attempt {attempt + 1})")
+            continue
+
+        limiter.update_from_headers(raw.headers)
+        response = await raw.parse()
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            limiter.release(reserved - usage.total_tokens)
+        return response
+
+async def generate_study_material(prompt: str, response_format: dict | None = {"type": "json_object"}, model: str = GROQ_MODEL_FAST, max_tokens: int = 700, temperature: float = 0.7, cache: bool = True) -> str:
+    """
+    Generates study material (flashcards/quiz) using Groq (Llama).
+    When the LLM cache is enabled, an identical earlier request is answered from it
+    without calling Groq; pass cache=False to always get a fresh completion.
+    """
+    cache_key = None
+    if cache and llm_cache:
+        cache_key = LLMCache.key(model, prompt, max_tokens, response_format, temperature)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     kwargs = {
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7,
+        "temperature": temperature,
         "max_tokens": max_tokens
     }
     if response_format:
         kwargs["response_format"] = response_format
-        
+
     try:
-        response = await groq_client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content
+        response = await create_chat_completion(**kwargs)
+        content = response.choices[0].message.content
     except Exception as e:
         print(f"Groq API Error: {type(e).__name__}: {str(e)}")
         # Raise so the route can catch and report back to user
         raise e
+
+    # Truncated completions are not worth replaying
+    if cache_key and content and response.choices[0].finish_reason == "stop":
+        llm_cache.put(cache_key, content)
+    return content
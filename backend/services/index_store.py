@@ -0,0 +1,76 @@
+"""
+Per-document index persistence shared by the vector and lexical indexes.
+
+Each document's index is a directory under the store's root, written to a scratch
+directory and swapped in so readers never see a half-written index. Loaded indexes are
+kept in an LRU of `max_documents`; a document without an index on disk is built from its
+stored chunks on first use.
+"""
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class DocumentIndexStore(Generic[T]):
+    """Subclasses say how an index is written, loaded and built from the stored chunks."""
+
+    def __init__(self, root: str, max_documents: int):
+        self.root = root
+        self.max_documents = max_documents
+        self._loaded: OrderedDict[str, T] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _write(self, index: T, path: str) -> None:
+        raise NotImplementedError
+
+    def _load(self, path: str) -> T | None:
+        """The index stored at `path`, or None if there is none (or it is stale)."""
+        raise NotImplementedError
+
+    def _build(self, document_id: str) -> T:
+        """Builds and stores the index from the document's stored chunks."""
+        raise NotImplementedError
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.root, document_id)
+
+    def _remember(self, document_id: str, index: T) -> None:
+        self._loaded[document_id] = index
+        self._loaded.move_to_end(document_id)
+        while len(self._loaded) > self.max_documents:
+            self._loaded.popitem(last=False)
+
+    def put(self, document_id: str, index: T) -> T:
+        """Persists the document's index, replacing any previous one, and keeps it loaded."""
+        path = self._path(document_id)
+        scratch = f"{path}.tmp-{threading.get_ident()}"
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        self._write(index, scratch)
+        with self._lock:
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(scratch, path)
+            self._remember(document_id, index)
+        return index
+
+    def get(self, document_id: str) -> T:
+        """The document's index: from memory, from disk, or built from its stored chunks."""
+        with self._lock:
+            index = self._loaded.get(document_id)
+            if index is not None:
+                self._loaded.move_to_end(document_id)
+                return index
+            index = self._load(self._path(document_id))
+            if index is not None:
+                self._remember(document_id, index)
+                return index
+        return self._build(document_id)
+
+    def invalidate(self, document_id: str) -> None:
+        with self._lock:
+            self._loaded.pop(document_id, None)
+            shutil.rmtree(self._path(document_id), ignore_errors=True)
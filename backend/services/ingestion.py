@@ -0,0 +1,598 @@
+"""
+Ingestion job pipeline.
+
+Uploads create a row in `ingestion_jobs` and return immediately. Workers running
+inside the API process pick jobs up and run the stages
+extract -> chunk -> embed -> store -> summary -> prewarm, recording per-stage status
+and timings. The document is usable once `store` has completed; summary and prewarm
+are optional.
+
+Jobs survive a process restart: the uploaded source and the embedded chunks are kept
+in a local workspace (DATA_DIR/jobs/<job_id>), and on startup every unfinished job is
+re-queued and resumes at its first unfinished stage group. Workers claim
+jobs with a lease so two processes never run the same job at once.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from typing import AsyncIterator, Iterator
+import numpy as np
+from postgrest import ReturnMethod
+from core.config import settings
+from services.supabase_client import supabase_client, invalidate_generated_content
+from services.pdf import stream_pdf_file, shutdown_process_pool
+from services.youtube import fetch_youtube_transcript_segments, extract_video_id
+from services.chunking import StreamingChunker
+from services.gemini_client import get_embeddings_batch, embedding_prefix
+from services.summary import generate_master_summary_background
+from services.prewarm import prewarm_document, budget_left as prewarm_budget_left
+from services.rate_limit import low_priority
+from services.vector_index import vector_index
+from services.lexical_index import lexical_index, LexicalIndexBuilder
+from services.query_cache import query_cache
+
+STAGES = ["extract", "chunk", "embed", "store", "summary", "prewarm"]
+
+JOBS_TABLE = "ingestion_jobs"
+JOBS_DIR = os.path.join(settings.DATA_DIR, "jobs")
+
+# Rows per document_chunks insert, keeps each PostgREST payload bounded
+STORE_BATCH_SIZE = 200
+
+_WORKER_ID = str(uuid.uuid4())
+_queue: asyncio.Queue | None = None
+_tasks: list[asyncio.Task] = []
+# Jobs this process is running, which its own sweep must never re-queue
+_held: set[str] = set()
+# Jobs waiting in the queue, so a sweep does not queue them a second time
+_pending: set[str] = set()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    # "Z" suffix rather than "+00:00": a "+" in a PostgREST filter would be read as a space
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _lease_expiry() -> str:
+    return _iso(_now() + timedelta(seconds=settings.INGEST_JOB_LEASE_SECONDS))
+
+
+def _workspace(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+# ---------------------------------------------------------------------------
+# Job records
+# ---------------------------------------------------------------------------
+
+def create_job(document_id: str, source_type: str, source_ref: str, source_bytes: bytes | None = None) -> dict:
+    """Creates a queued job for a document, saving the uploaded bytes (if any) to its workspace."""
+    job_id = str(uuid.uuid4())
+    workspace = _workspace(job_id)
+    os.makedirs(workspace, exist_ok=True)
+    if source_bytes is not None:
+        with open(os.path.join(workspace, "source.bin"), "wb") as f:
+            f.write(source_bytes)
+
+    stages = {stage: {"status": "pending"} for stage in STAGES}
+    if not settings.INGEST_GENERATE_SUMMARY:
+        stages["summary"]["status"] = "skipped"
+    if not settings.INGEST_PREWARM:
+        stages["prewarm"]["status"] = "skipped"
+
+    res = supabase_client.table(JOBS_TABLE).insert({
+        "id": job_id,
+        "document_id": document_id,
+        "source_type": source_type,
+        "source_ref": source_ref,
+        "status": "queued",
+        "stages": stages,
+        "chunk_count": 0,
+        "embedded_count": 0,
+    }).execute()
+    return res.data[0]
+
+
+def get_job(job_id: str) -> dict | None:
+    res = supabase_client.table(JOBS_TABLE).select("*").eq("id", job_id).execute()
+    return res.data[0] if res.data else None
+
+
+def _update_job(job_id: str, fields: dict) -> None:
+    # Every write also renews the lease, so a live worker never loses its job
+    fields = {"locked_until": _lease_expiry(), "updated_at": _iso(_now()), **fields}
+    supabase_client.table(JOBS_TABLE).update(fields).eq("id", job_id).execute()
+
+
+def _renew_lease(job_id: str) -> None:
+    supabase_client.table(JOBS_TABLE).update({"locked_until": _lease_expiry()}) \
+        .eq("id", job_id).eq("worker_id", _WORKER_ID).eq("status", "running").execute()
+
+
+async def _heartbeat(job_id: str) -> None:
+    # Stages such as summary can run far longer than a lease without writing to the job
+    while True:
+        await asyncio.sleep(settings.INGEST_JOB_LEASE_SECONDS / 3)
+        try:
+            await asyncio.to_thread(_renew_lease, job_id)
+        except Exception as e:
+            print(f"Could not renew the lease on ingestion job {job_id}: {e}")
+
+
+def _claim_job(job_id: str) -> dict | None:
+    """Takes the lease on a job unless it is finished or another worker holds a live lease."""
+    now = _iso(_now())
+    res = supabase_client.table(JOBS_TABLE).update({
+        "status": "running",
+        "worker_id": _WORKER_ID,
+        "locked_until": _lease_expiry(),
+        "updated_at": now,
+    }).eq("id", job_id) \
+        .in_("status", ["queued", "running"]) \
+        .or_(f"locked_until.is.null,locked_until.lt.{now}") \
+        .execute()
+    return res.data[0] if res.data else None
+
+
+def pdf_content_hash(pdf_bytes: bytes) -> str:
+    return f"pdf:sha256:{hashlib.sha256(pdf_bytes).hexdigest()}"
+
+
+def youtube_content_hash(url: str) -> str:
+    # extract_video_id normalizes watch/embed/short links, so all forms of a video share a key
+    return f"youtube:{extract_video_id(url)}"
+
+
+def find_existing_ingestion(content_hash: str) -> dict | None:
+    """
+    Returns the latest job of a document with the same content that is ingested or still
+    ingesting, so a repeat upload can reuse its chunks and embeddings. Failed ingestions
+    and videos ingested without a transcript are not reused.
+    """
+    res = supabase_client.table("documents") \
+        .select("id, ingestion_jobs(id, document_id, status, transcript_found, created_at)") \
+        .eq("content_hash", content_hash) \
+        .order("created_at") \
+        .execute()
+    for doc in res.data or []:
+        jobs = sorted(doc.get("ingestion_jobs") or [], key=lambda j: j["created_at"])
+        if jobs and jobs[-1]["status"] != "failed" and jobs[-1].get("transcript_found") is not False:
+            return jobs[-1]
+    return None
+
+
+def retry_job(job_id: str) -> dict | None:
+    """Re-queues a failed job; it resumes at the stage group that failed."""
+    res = supabase_client.table(JOBS_TABLE).update({
+        "status": "queued",
+        "error": None,
+        "updated_at": _iso(_now()),
+    }).eq("id", job_id).eq("status", "failed").execute()
+    if not res.data:
+        return None
+    enqueue_job(job_id)
+    return res.data[0]
+
+
+def is_ready(job: dict) -> bool:
+    """The document can be searched and studied once its chunks are stored."""
+    return (job.get("stages") or {}).get("store", {}).get("status") == "completed"
+
+
+def job_progress(job: dict) -> float:
+    """Fraction of the pipeline completed (0.0 - 1.0), counting embedding progress within its stage."""
+    stages = job.get("stages") or {}
+    active = [s for s in STAGES if stages.get(s, {}).get("status") != "skipped"]
+    if not active:
+        return 1.0
+    done = sum(1 for s in active if stages.get(s, {}).get("status") == "completed")
+    if stages.get("embed", {}).get("status") == "running" and job.get("chunk_count"):
+        done += job.get("embedded_count", 0) / job["chunk_count"]
+    return round(done / len(active), 3)
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+class _StageTracker:
+    """Keeps a job's per-stage status and timings and writes them back to the job row."""
+
+    def __init__(self, job_id: str, stages: dict):
+        self.job_id = job_id
+        self.stages = stages
+        self._started: dict[str, float] = {}
+
+    def is_done(self, stage: str) -> bool:
+        return self.stages.get(stage, {}).get("status") in ("completed", "skipped")
+
+    def running(self) -> list[str]:
+        return [s for s in STAGES if self.stages.get(s, {}).get("status") == "running"]
+
+    async def _save(self, extra: dict | None = None) -> None:
+        running = self.running()
+        await asyncio.to_thread(_update_job, self.job_id, {"stages": self.stages, "current_stage": running[0] if running else None, **(extra or {})})
+
+    async def start(self, stages: tuple[str, ...]) -> None:
+        for stage in stages:
+            self._started[stage] = time.perf_counter()
+            self.stages[stage] = {"status": "running", "started_at": _iso(_now())}
+        await self._save()
+
+    def _end(self, stage: str, status: str) -> None:
+        self.stages[stage].update({
+            "status": status,
+            "finished_at": _iso(_now()),
+            "duration_ms": round((time.perf_counter() - self._started[stage]) * 1000),
+        })
+
+    async def finish(self, stage: str) -> None:
+        if self.stages.get(stage, {}).get("status") == "running":
+            self._end(stage, "completed")
+            await self._save()
+
+    async def skip(self, stage: str, reason: str | None = None) -> None:
+        if self.stages.get(stage, {}).get("status") == "running":
+            self._end(stage, "skipped")
+            if reason:
+                self.stages[stage]["reason"] = reason
+            await self._save()
+
+    async def fail(self, stage: str, error: str) -> None:
+        # Stages running alongside the failed one were interrupted; they re-run on retry
+        for other in self.running():
+            if other != stage:
+                self.stages[other] = {"status": "pending"}
+        if self.stages.get(stage, {}).get("status") == "running":
+            self._end(stage, "failed")
+        await self._save({"status": "failed", "error": f"{stage}: {error}", "locked_until": None})
+
+
+class _StageError(Exception):
+    """Names the stage that raised, where a group runs several stages at once."""
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(str(error))
+        self.stage = stage
+
+
+async def _source_segments(job: dict, workspace: str) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Yields (text, position) piece by piece: PDF pages as they are parsed with their page
+    number, or transcript snippets with their time range.
+    """
+    if job["source_type"] == "pdf":
+        pages = stream_pdf_file(os.path.join(workspace, "source.bin"))
+        try:
+            async for page_number, page_text in pages:
+                if page_text.strip():
+                    yield page_text, {"page": page_number}
+        finally:
+            await pages.aclose()
+    else:
+        try:
+            snippets = await asyncio.to_thread(fetch_youtube_transcript_segments, job["source_ref"])
+        except Exception as e:
+            # The document is kept without chunks, as the upload route always did
+            print(f"No transcript for {job['source_ref']}: {e}. Proceeding with URL fallback.")
+            return
+        for snippet in snippets:
+            if snippet["text"].strip():
+                yield snippet["text"], {"time_range": (snippet["start"], snippet["start"] + snippet["duration"])}
+
+
+async def _extracted_segments(job: dict, workspace: str) -> AsyncIterator[tuple[str, dict]]:
+    try:
+        async for segment in _source_segments(job, workspace):
+            yield segment
+    except Exception as e:
+        raise _StageError("extract", e) from e
+
+
+async def _stage_extract_chunk_embed(job: dict, workspace: str, tracker: _StageTracker) -> None:
+    """
+    Extraction, chunking and embedding overlap: chunks are cut as pages arrive and each
+    full batch is sent for embedding while parsing continues. Finished batches are appended
+    to chunks.jsonl in order, so neither the full text nor all embeddings sit in memory.
+    """
+    chunker = StreamingChunker(chunk_size=700, chunk_overlap=100)
+    # PDFs fail the job on an embedding error; YouTube keeps chunks from
+    # failed batches without embeddings, as the upload route always did
+    tolerate_failures = job["source_type"] == "youtube"
+
+    out_path = os.path.join(workspace, "chunks.jsonl")
+    pending: deque[tuple[list[dict], asyncio.Task]] = deque()
+    batch: list[dict] = []
+    counts = {"chunks": 0, "embedded": 0}
+
+    def submit(chunks: list[dict]) -> None:
+        # Bulk batches take the embedding quota only when interactive calls (chat queries) leave it unused
+        with low_priority():
+            task = asyncio.create_task(get_embeddings_batch([c["content"] for c in chunks], return_exceptions=tolerate_failures))
+        pending.append((chunks, task))
+
+    async def drain(out, max_pending: int) -> None:
+        # Write finished batches in order; waiting here also throttles the page parser
+        while len(pending) > max_pending:
+            chunks, task = pending.popleft()
+            try:
+                embeddings = await task
+            except Exception as e:
+                raise _StageError("embed", e) from e
+            for chunk, embedding in zip(chunks, embeddings):
+                out.write(json.dumps({**chunk, "embedding": embedding}) + "\n")
+            counts["embedded"] += sum(1 for e in embeddings if e is not None)
+            await asyncio.to_thread(_update_job, job["id"], {"chunk_count": counts["chunks"], "embedded_count": counts["embedded"]})
+
+    try:
+        with open(f"{out_path}.tmp", "w", encoding="utf-8") as out:
+            async for segment, position in _extracted_segments(job, workspace):
+                try:
+                    new_chunks = chunker.feed(segment, **position)
+                except Exception as e:
+                    raise _StageError("chunk", e) from e
+                for chunk in new_chunks:
+                    batch.append(chunk)
+                    counts["chunks"] += 1
+                    if len(batch) == settings.EMBEDDING_BATCH_SIZE:
+                        submit(batch)
+                        batch = []
+                        await drain(out, settings.EMBEDDING_MAX_CONCURRENCY)
+            await tracker.finish("extract")
+
+            for chunk in chunker.flush():
+                batch.append(chunk)
+                counts["chunks"] += 1
+            if job["source_type"] == "youtube":
+                # Without a transcript the job still completes, with no chunks
+                job["transcript_found"] = counts["chunks"] > 0
+                await asyncio.to_thread(_update_job, job["id"], {"transcript_found": job["transcript_found"]})
+            elif counts["chunks"] == 0:
+                raise _StageError("extract", Exception("No text could be extracted from the source."))
+            if batch:
+                submit(batch)
+            await asyncio.to_thread(_update_job, job["id"], {"chunk_count": counts["chunks"]})
+            await tracker.finish("chunk")
+
+            await drain(out, 0)
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+    os.replace(f"{out_path}.tmp", out_path)
+
+
+def _iter_chunk_file(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _insert_chunks(records: list[dict]) -> None:
+    supabase_client.table("document_chunks").insert(records, returning=ReturnMethod.minimal).execute()
+
+
+def _store_centroid(document_id: str, centroid, embedded: int) -> None:
+    """Upserts the document's centroid, which the two-stage global search ranks documents by."""
+    if centroid is None:
+        supabase_client.table("document_centroids").delete().eq("document_id", document_id).execute()
+        return
+    centroid = centroid / (np.linalg.norm(centroid) or 1.0)
+    supabase_client.table("document_centroids").upsert({
+        "document_id": document_id,
+        "centroid": centroid.astype(np.float32).tolist(),
+        "chunk_count": embedded,
+        "updated_at": _iso(_now()),
+    }, on_conflict="document_id").execute()
+
+
+async def _stage_store(job: dict, workspace: str, tracker: _StageTracker) -> None:
+    document_id = job["document_id"]
+
+    # Clear rows left by an interrupted earlier attempt so a resumed store is idempotent
+    await asyncio.to_thread(lambda: supabase_client.table("document_chunks").delete().eq("document_id", document_id).execute())
+    # Anything generated or indexed from the previous chunks is stale now
+    await asyncio.to_thread(invalidate_generated_content, document_id)
+    vector_index.invalidate(document_id)
+    lexical_index.invalidate(document_id)
+    if query_cache:
+        query_cache.invalidate(document_id)
+
+    # The BM25 index is built batch by batch from the inserted rows. Ids are assigned here, so the
+    # inserts need not send the rows (and their embeddings) back
+    lexical = LexicalIndexBuilder(document_id)
+    centroid = None
+    embedded = 0
+    records = []
+    stored = 0
+    for i, row in enumerate(_iter_chunk_file(os.path.join(workspace, "chunks.jsonl"))):
+        record = {
+            "id": str(uuid.uuid4()),
+            "document_id": document_id,
+            "content": row["content"],
+            "metadata": {"chunk_index": i, **row["metadata"]},
+        }
+        if row["embedding"] is not None:
+            record["embedding"] = row["embedding"]
+            if settings.EMBEDDING_STORAGE == "compact":
+                record["embedding_short"] = embedding_prefix(row["embedding"])
+            # Running sum of normalized embeddings for the document centroid
+            vector = np.asarray(row["embedding"], dtype=np.float64)
+            vector /= np.linalg.norm(vector) or 1.0
+            centroid = vector if centroid is None else centroid + vector
+            embedded += 1
+        records.append(record)
+        if len(records) == STORE_BATCH_SIZE:
+            await asyncio.to_thread(_insert_chunks, records)
+            lexical.add(records)
+            stored += len(records)
+            records = []
+    if records:
+        await asyncio.to_thread(_insert_chunks, records)
+        lexical.add(records)
+        stored += len(records)
+    await asyncio.to_thread(lexical_index.save, document_id, lexical)
+    # A query during the inserts may have built the vector index or cached retrievals from a partial set of chunks
+    vector_index.invalidate(document_id)
+    if query_cache:
+        query_cache.invalidate(document_id)
+    await asyncio.to_thread(_store_centroid, document_id, centroid, embedded)
+    print(f"Stored {stored} chunks for document {document_id}.")
+
+
+async def _stage_summary(job: dict, workspace: str, tracker: _StageTracker) -> None:
+    if job.get("transcript_found") is False:
+        await tracker.skip("summary")
+        return
+    await generate_master_summary_background(job["document_id"])
+
+
+async def _stage_prewarm(job: dict, workspace: str, tracker: _StageTracker) -> None:
+    if job.get("transcript_found") is False:
+        await tracker.skip("prewarm")
+    elif not await asyncio.to_thread(prewarm_budget_left):
+        print(f"Pre-warm budget of {settings.PREWARM_DAILY_LIMIT} documents/day reached; skipping document {job['document_id']}.")
+        await tracker.skip("prewarm", "daily budget reached")
+    elif not await prewarm_document(job["document_id"]):
+        # Not counted against the daily budget, which only counts completed prewarms
+        await tracker.skip("prewarm", "generation failed")
+
+
+# Stages grouped by the function that runs them; a group is re-run as a whole on resume
+_PIPELINE = [
+    (("extract", "chunk", "embed"), _stage_extract_chunk_embed),
+    (("store",), _stage_store),
+    (("summary",), _stage_summary),
+    (("prewarm",), _stage_prewarm),
+]
+
+
+async def run_job(job_id: str) -> None:
+    """Runs (or resumes) a job from its first unfinished stage group."""
+    if job_id in _held:
+        return
+    job = await asyncio.to_thread(_claim_job, job_id)
+    if not job:
+        return
+
+    _held.add(job_id)
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _run_stages(job_id, job)
+    finally:
+        heartbeat.cancel()
+        _held.discard(job_id)
+
+
+async def _run_stages(job_id: str, job: dict) -> None:
+    workspace = _workspace(job_id)
+    tracker = _StageTracker(job_id, job.get("stages") or {stage: {"status": "pending"} for stage in STAGES})
+
+    for group, runner in _PIPELINE:
+        if all(tracker.is_done(stage) for stage in group):
+            continue
+        todo = tuple(stage for stage in group if tracker.stages.get(stage, {}).get("status") != "skipped")
+
+        await tracker.start(todo)
+        try:
+            await runner(job, workspace, tracker)
+        except Exception as e:
+            import traceback
+            failed_stage = e.stage if isinstance(e, _StageError) else (tracker.running() or list(todo))[0]
+            print(f"Ingestion job {job_id} failed at stage '{failed_stage}': {e}")
+            print(traceback.format_exc())
+            await tracker.fail(failed_stage, str(e))
+            return
+        for stage in todo:
+            await tracker.finish(stage)
+
+    await asyncio.to_thread(_update_job, job_id, {"status": "completed", "current_stage": None, "error": None})
+    shutil.rmtree(workspace, ignore_errors=True)
+    print(f"Ingestion job {job_id} completed for document {job['document_id']}.")
+
+
+# ---------------------------------------------------------------------------
+# Workers
+# ---------------------------------------------------------------------------
+
+def enqueue_job(job_id: str) -> bool:
+    """Queues a job unless it is already queued or running here; returns whether it was queued."""
+    if _queue is None:
+        raise RuntimeError("Ingestion workers are not running.")
+    if job_id in _pending or job_id in _held:
+        return False
+    _pending.add(job_id)
+    _queue.put_nowait(job_id)
+    return True
+
+
+async def _worker_loop() -> None:
+    while True:
+        job_id = await _queue.get()
+        _pending.discard(job_id)
+        try:
+            await run_job(job_id)
+        except Exception as e:
+            print(f"Ingestion worker error on job {job_id}: {e}")
+        finally:
+            _queue.task_done()
+
+
+def _unfinished_job_ids() -> list[str]:
+    res = supabase_client.table(JOBS_TABLE) \
+        .select("id") \
+        .in_("status", ["queued", "running"]) \
+        .or_(f"locked_until.is.null,locked_until.lt.{_iso(_now())}") \
+        .order("created_at") \
+        .execute()
+    return [row["id"] for row in res.data or []]
+
+
+async def _requeue_unfinished_jobs() -> int:
+    job_ids = await asyncio.to_thread(_unfinished_job_ids)
+    return sum(enqueue_job(job_id) for job_id in job_ids)
+
+
+async def _sweep_loop() -> None:
+    # Picks up jobs whose worker died (expired lease), e.g. after a crash of another process
+    while True:
+        await asyncio.sleep(settings.INGEST_JOB_LEASE_SECONDS)
+        try:
+            await _requeue_unfinished_jobs()
+        except Exception as e:
+            print(f"Ingestion sweep failed: {e}")
+
+
+async def start_workers() -> None:
+    """Starts the ingestion workers and re-queues jobs left unfinished by a previous process."""
+    global _queue
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    _queue = asyncio.Queue()
+    for _ in range(settings.INGEST_WORKERS):
+        _tasks.append(asyncio.create_task(_worker_loop()))
+    _tasks.append(asyncio.create_task(_sweep_loop()))
+
+    try:
+        resumed = await _requeue_unfinished_jobs()
+        if resumed:
+            print(f"Resuming {resumed} unfinished ingestion job(s).")
+    except Exception as e:
+        print(f"Could not resume ingestion jobs: {e}")
+
+
+async def stop_workers() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    shutdown_process_pool()
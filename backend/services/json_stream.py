@@ -0,0 +1,64 @@
+import json
+
+class JsonArrayItemParser:
+    """
+    Incremental parser for a streamed JSON object whose values are arrays of objects,
+    e.g. {"flashcards": [{...}, ...], "questions": [{...}, ...]}.
+
+    Text is fed as it arrives; feed() returns (key, item) for every array element
+    that closed in that piece, so each object can be used before the document is complete.
+    Anything before the opening brace (such as a markdown fence) is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: str | None = None
+        self._array_key: str | None = None
+        self._item_start: int | None = None
+
+    def feed(self, text: str) -> list[tuple[str, dict]]:
+        self._buffer += text
+        items = []
+        buffer = self._buffer
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        # Strings directly inside the top-level object are keys or scalar values;
+                        # only the one followed by an array matters
+                        self._last_key = buffer[self._string_start:pos]
+                continue
+
+            if char == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = pos + 1
+            elif char in "{[":
+                if not self._stack and char == "[":
+                    continue
+                if char == "[" and len(self._stack) == 1:
+                    self._array_key = self._last_key
+                elif char == "{" and len(self._stack) == 2 and self._stack[-1] == "[":
+                    self._item_start = pos
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and len(self._stack) == 2 and self._item_start is not None:
+                    try:
+                        items.append((self._array_key, json.loads(buffer[self._item_start:pos + 1])))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+        self._pos = len(buffer)
+        return items
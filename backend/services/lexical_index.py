@@ -0,0 +1,141 @@
+"""
+BM25 inverted index over chunk text, one per document.
+
+Postings are array-backed: a sorted vocabulary, an offsets array into flat arrays of
+chunk positions and term frequencies, and an array of chunk lengths, saved as one .npz
+under DATA_DIR/lexical/<document_id> next to the chunk rows. The index is built
+incrementally as the ingestion store stage inserts chunks, or lazily from the stored
+chunks for documents ingested earlier, and loaded indexes are kept in an LRU of
+LEXICAL_INDEX_MAX_DOCUMENTS documents.
+"""
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+from core.config import settings
+from services.supabase_client import fetch_document_chunks
+from services.index_store import DocumentIndexStore
+
+INDEX_DIR = os.path.join(settings.DATA_DIR, "lexical")
+
+# Words, numbers and identifiers such as snake_case names stay whole
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalIndexBuilder:
+    """Accumulates chunks one batch at a time and writes the finished index."""
+
+    def __init__(self, document_id: str):
+        self.document_id = document_id
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+        self._rows: list[dict] = []
+
+    def add(self, rows: list[dict]) -> None:
+        for row in rows:
+            position = len(self._rows)
+            tokens = tokenize(row["content"])
+            for term, tf in Counter(tokens).items():
+                self._postings.setdefault(term, []).append((position, tf))
+            self._lengths.append(len(tokens))
+            self._rows.append({"id": row.get("id"), "document_id": self.document_id, "content": row["content"], "metadata": row.get("metadata")})
+
+    def finish(self) -> "LexicalIndex":
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(self._postings[term])
+        chunks = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            postings = self._postings[term]
+            chunks[offsets[i]:offsets[i + 1]] = [p for p, _ in postings]
+            tfs[offsets[i]:offsets[i + 1]] = [min(tf, 65535) for _, tf in postings]
+        return LexicalIndex(terms, offsets, chunks, tfs, np.array(self._lengths, dtype=np.int32), self._rows)
+
+
+class LexicalIndex:
+    def __init__(self, terms: list[str], offsets: np.ndarray, chunks: np.ndarray, tfs: np.ndarray, lengths: np.ndarray, rows: list[dict]):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.chunks = chunks
+        self.tfs = tfs
+        self.lengths = lengths
+        self.rows = rows
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    def save(self, path: str) -> None:
+        """Writes the index files into the directory `path`."""
+        terms = sorted(self.terms, key=self.terms.get)
+        np.savez(os.path.join(path, "postings.npz"), offsets=self.offsets, chunks=self.chunks, tfs=self.tfs, lengths=self.lengths)
+        with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(os.path.join(path, "rows.json"), "w", encoding="utf-8") as f:
+            json.dump(self.rows, f)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex | None":
+        if not os.path.exists(os.path.join(path, "rows.json")):
+            return None
+        arrays = np.load(os.path.join(path, "postings.npz"))
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as f:
+            terms = json.load(f)
+        with open(os.path.join(path, "rows.json"), encoding="utf-8") as f:
+            rows = json.load(f)
+        return cls(terms, arrays["offsets"], arrays["chunks"], arrays["tfs"], arrays["lengths"], rows)
+
+    def search(self, query: str, k: int) -> list[dict]:
+        """Top-k chunks by BM25 score for the query terms, best first (chunks matching no term are left out)."""
+        n = len(self.rows)
+        if not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / (self.avg_length or 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunks, tfs = self.chunks[start:end], self.tfs[start:end].astype(np.float32)
+            idf = np.log(1 + (n - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[chunks] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[chunks])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.rows[i], "bm25": float(scores[i])} for i in top]
+
+
+class LexicalIndexStore(DocumentIndexStore[LexicalIndex]):
+    """Persists and caches the per-document lexical indexes."""
+
+    def save(self, document_id: str, builder: LexicalIndexBuilder) -> LexicalIndex:
+        return self.put(document_id, builder.finish())
+
+    def _build(self, document_id: str) -> LexicalIndex:
+        builder = LexicalIndexBuilder(document_id)
+        builder.add(fetch_document_chunks(document_id))
+        return self.save(document_id, builder)
+
+    def _write(self, index: LexicalIndex, path: str) -> None:
+        index.save(path)
+
+    def _load(self, path: str) -> LexicalIndex | None:
+        return LexicalIndex.load(path)
+
+    def search(self, document_id: str, query: str, k: int) -> list[dict]:
+        return self.get(document_id).search(query, k)
+
+
+lexical_index = LexicalIndexStore(INDEX_DIR, settings.LEXICAL_INDEX_MAX_DOCUMENTS)
@@ -0,0 +1,51 @@
+import hashlib
+import json
+import os
+from core.config import settings
+from services.disk_cache import DiskCache
+
+class LLMCache:
+    """
+    Persistent cache of LLM completions, addressed by everything that shapes the output:
+    model, prompt, max_tokens, response_format and temperature. Entries expire after a TTL
+    and the store is size-bounded (least recently read entries are evicted first).
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: float):
+        self.ttl = ttl
+        self._disk = DiskCache(path, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, prompt: str, max_tokens: int | None, response_format: dict | None, temperature: float) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8", "replace")).hexdigest()
+        params = json.dumps([max_tokens, response_format, temperature], sort_keys=True)
+        params_hash = hashlib.sha256(params.encode()).hexdigest()[:16]
+        return f"{model}:{params_hash}:{prompt_hash}"
+
+    def get(self, key: str) -> str | None:
+        data = self._disk.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data.decode("utf-8")
+
+    def put(self, key: str, completion: str) -> None:
+        self._disk.set(key, completion.encode("utf-8"), ttl=self.ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "disk": self._disk.stats(),
+        }
+
+llm_cache = LLMCache(
+    os.path.join(settings.DATA_DIR, "cache", "llm.sqlite"),
+    max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+    ttl=settings.LLM_CACHE_TTL_SECONDS,
+) if settings.LLM_CACHE_ENABLED else None
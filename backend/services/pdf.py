@@ -1,15 +1,155 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Iterator
 import fitz  # PyMuPDF
-import io
+from core.config import settings
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    """Extracts text from a PDF file provided as bytes."""
+_DONE = object()
+
+# Created on first use and shared by all uploads so process startup is paid once
+_process_pool: ProcessPoolExecutor | None = None
+
+def _open_pdf(source: bytes | str) -> fitz.Document:
+    """Opens a PDF from bytes or from a file path."""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def iter_pdf_pages(source: bytes | str) -> Iterator[tuple[int, str]]:
+    """Yields (page_number, text) for each page of a PDF, one page at a time. Page numbers start at 1."""
+    try:
+        doc = _open_pdf(source)
+    except Exception as e:
+        raise Exception(f"Failed to extract text from PDF: {str(e)}")
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        text_content = []
         for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text_content.append(page.get_text())
+            try:
+                page = doc.load_page(page_num)
+                yield page_num + 1, page.get_text()
+            except Exception as e:
+                raise Exception(f"Failed to extract text from PDF: {str(e)}")
+    finally:
         doc.close()
-        return " ".join(text_content)
+
+def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+    """Extracts text from a PDF file provided as bytes."""
+    return " ".join(text for _, text in iter_pdf_pages(pdf_bytes))
+
+def count_pdf_pages(source: bytes | str) -> int:
+    try:
+        with _open_pdf(source) as doc:
+            return len(doc)
     except Exception as e:
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
+
+async def stream_pdf_pages(source: bytes | str, max_buffered_pages: int = 8) -> AsyncIterator[tuple[int, str]]:
+    """
+    Async page stream: PyMuPDF parses in a worker thread so the event loop stays free,
+    and pages are handed over as soon as they are parsed. At most `max_buffered_pages`
+    pages wait in memory, so a slow consumer pauses the parser instead of piling up text.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(max_buffered_pages)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for page in iter_pdf_pages(source):
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, page)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    producer = asyncio.create_task(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            slots.release()
+            yield item
+    finally:
+        # Consumer stopped early (error or cancel): let the parser thread exit
+        stop.set()
+        await producer
+
+def _extract_page_range(path: str, start: int, end: int) -> list[str]:
+    """Process-pool worker: opens the PDF file itself and extracts pages [start, end)."""
+    with fitz.open(path) as doc:
+        return [doc.load_page(page_num).get_text() for page_num in range(start, end)]
+
+def _process_pool_size() -> int:
+    return settings.PDF_PROCESS_WORKERS or os.cpu_count() or 1
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that runs an event loop and threads is not safe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=_process_pool_size(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+async def stream_pdf_pages_parallel(path: str, page_count: int) -> AsyncIterator[tuple[int, str]]:
+    """
+    Splits the page range into blocks extracted by a process pool. Each worker opens the
+    file on disk, so only page text crosses process boundaries. Blocks are yielded in page
+    order; only a bounded number are submitted ahead of the consumer.
+    """
+    pool = _get_process_pool()
+    block = settings.PDF_PAGES_PER_TASK
+    ranges = [(start, min(start + block, page_count)) for start in range(0, page_count, block)]
+    max_ahead = _process_pool_size() * 2
+
+    futures: list[asyncio.Future] = []
+    next_range = 0
+    try:
+        for start, _ in ranges:
+            while next_range < len(ranges) and len(futures) < max_ahead:
+                r_start, r_end = ranges[next_range]
+                futures.append(asyncio.wrap_future(pool.submit(_extract_page_range, path, r_start, r_end)))
+                next_range += 1
+            try:
+                texts = await futures.pop(0)
+            except Exception as e:
+                raise Exception(f"Failed to extract text from PDF: {str(e)}")
+            for offset, text in enumerate(texts):
+                yield start + offset + 1, text
+    finally:
+        for future in futures:
+            future.cancel()
+
+async def stream_pdf_file(path: str) -> AsyncIterator[tuple[int, str]]:
+    """
+    Streams (page_number, text) for a PDF on disk, using the process pool for documents
+    of at least PDF_PARALLEL_MIN_PAGES pages and a single worker thread otherwise.
+    """
+    page_count = await asyncio.to_thread(count_pdf_pages, path)
+    if settings.PDF_PARALLEL_MIN_PAGES and page_count >= settings.PDF_PARALLEL_MIN_PAGES:
+        pages = stream_pdf_pages_parallel(path, page_count)
+    else:
+        pages = stream_pdf_pages(path)
+    try:
+        async for page in pages:
+            yield page
+    finally:
+        await pages.aclose()
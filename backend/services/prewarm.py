@@ -0,0 +1,44 @@
+"""
+Post-ingest pre-warming.
+
+After a document is ingested, the medium-difficulty flashcards + quiz and the mind map
+are generated in the background and stored, so the first request for them is a cache
+hit. Calls run at low priority on the Groq limiter, and the number of documents warmed
+per day is capped by PREWARM_DAILY_LIMIT.
+"""
+from datetime import datetime, timezone
+from core.config import settings
+from services.supabase_client import supabase_client
+from services.rate_limit import low_priority
+from services.study_material import generate_study_set, generate_mindmap
+
+
+def prewarms_today() -> int:
+    """Documents pre-warmed since midnight UTC (counted from the ingestion jobs' completed prewarm stages)."""
+    midnight = datetime.now(timezone.utc).strftime("%Y-%m-%dT00:00:00Z")
+    res = supabase_client.table("ingestion_jobs") \
+        .select("id", count="exact") \
+        .eq("stages->prewarm->>status", "completed") \
+        .gte("stages->prewarm->>started_at", midnight) \
+        .execute()
+    return res.count or 0
+
+
+def budget_left() -> bool:
+    return prewarms_today() < settings.PREWARM_DAILY_LIMIT
+
+
+async def prewarm_document(document_id: str) -> bool:
+    """Generates and stores the default study material of a document. Returns False when none of it could be generated."""
+    generated = 0
+    with low_priority():
+        for name, generate in (("study set", generate_study_set), ("mind map", generate_mindmap)):
+            try:
+                await generate(document_id)
+                generated += 1
+            except Exception as e:
+                # Best effort: a miss here only means the first user request generates it
+                print(f"Pre-warming the {name} of document {document_id} failed: {e}")
+    if generated:
+        print(f"Pre-warmed study material for document {document_id}.")
+    return generated > 0
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from core.config import settings
+
+# Scope of library-wide queries (document-scoped queries use their document id)
+LIBRARY_SCOPE = ""
+
+def _text_key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+class SemanticQueryCache:
+    """
+    In-process cache of recent chat retrievals, per document (plus one scope for the whole
+    library): query text and normalized embedding → retrieved chunks. An exact repeat of a
+    query (ignoring case and whitespace) is found without an embedding; a rephrasing is
+    found when its embedding is within `threshold` cosine similarity of a cached one.
+    Entries expire after a TTL, each scope keeps its `max_entries` most recent queries,
+    and a document's entries are dropped whenever its chunks change.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int, max_scopes: int = 256):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        # scope → text key → (normalized embedding, chunks, stored at)
+        self._scopes: OrderedDict[str, OrderedDict[str, tuple[np.ndarray, list[dict], float]]] = OrderedDict()
+        self._lock = Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _entries(self, scope: str) -> OrderedDict:
+        """The scope's unexpired entries (call with the lock held)."""
+        entries = self._scopes.get(scope)
+        if entries is None:
+            return OrderedDict()
+        cutoff = time.monotonic() - self.ttl
+        for key in [k for k, (_, _, stored) in entries.items() if stored < cutoff]:
+            del entries[key]
+        self._scopes.move_to_end(scope)
+        return entries
+
+    def get_text(self, scope: str, query: str) -> list[dict] | None:
+        """Chunks cached for exactly this query, or None."""
+        with self._lock:
+            entry = self._entries(scope).get(_text_key(query))
+            if entry is None:
+                return None
+            self.exact_hits += 1
+            return entry[1]
+
+    def get_similar(self, scope: str, embedding: list[float]) -> list[dict] | None:
+        """Chunks cached for the most similar query at or above the threshold, or None."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            entries = self._entries(scope)
+            if entries:
+                values = list(entries.values())
+                scores = np.stack([v[0] for v in values]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.semantic_hits += 1
+                    return values[best][1]
+            self.misses += 1
+            return None
+
+    def put(self, scope: str, query: str, embedding: list[float], chunks: list[dict]) -> None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            entries = self._scopes.setdefault(scope, OrderedDict())
+            self._scopes.move_to_end(scope)
+            key = _text_key(query)
+            entries.pop(key, None)
+            entries[key] = (vector, chunks, time.monotonic())
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+    def invalidate(self, document_id: str) -> None:
+        """Drops the document's entries, and the library-wide ones, which may include its chunks."""
+        with self._lock:
+            self._scopes.pop(document_id, None)
+            self._scopes.pop(LIBRARY_SCOPE, None)
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            "scopes": len(self._scopes),
+        }
+
+query_cache = SemanticQueryCache(
+    threshold=settings.QUERY_CACHE_SIMILARITY,
+    ttl=settings.QUERY_CACHE_TTL_SECONDS,
+    max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+) if settings.QUERY_CACHE_ENABLED else None
@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import re
+import time
+from contextlib import contextmanager
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+# Set for background work (e.g. pre-warming); such calls only take quota the foreground is not using
+_low_priority = contextvars.ContextVar("rate_limit_low_priority", default=False)
+
+# Share of each bucket a low-priority call leaves untouched for foreground requests
+LOW_PRIORITY_HEADROOM = 0.5
+
+@contextmanager
+def low_priority():
+    """Runs the enclosed calls (and tasks started inside) at low priority on every limiter."""
+    token = _low_priority.set(True)
+    try:
+        yield
+    finally:
+        _low_priority.reset(token)
+
+def parse_duration(value: str | None) -> float | None:
+    """Parses provider reset/retry durations such as '7.66s', '2m59.56s', '250ms' or '13' into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+class RateLimiter:
+    """
+    Async limiter for a provider quota expressed as requests per minute and tokens per minute.
+
+    Both quotas are token buckets that refill continuously, so a caller only waits as long
+    as the quota actually requires. Waiters are served in arrival order. The local estimate
+    is corrected from the provider's rate-limit headers and from 429 retry-after hints.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int | None = None):
+        self.name = name
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = self._blocked_until - now
+        if self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _has_headroom(self, tokens: int) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        if self._lock.locked() or self._blocked_until > now:
+            return False
+        if self._requests - 1 < self.rpm * LOW_PRIORITY_HEADROOM:
+            return False
+        return not self.tpm or self._tokens - tokens >= min(self.tpm * LOW_PRIORITY_HEADROOM, self.tpm - tokens)
+
+    async def acquire(self, tokens: int = 0) -> int:
+        """Waits until one request and `tokens` tokens fit the quota, then reserves them. Returns the tokens reserved."""
+        # A single call larger than the whole minute budget can still go once the bucket is full
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        if _low_priority.get():
+            # Background calls stay out of the queue until nobody is waiting and the buckets are half full
+            while not self._has_headroom(tokens):
+                await asyncio.sleep(1.0)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return tokens
+                await asyncio.sleep(wait)
+
+    def release(self, tokens: int) -> None:
+        """Returns reserved tokens that a call did not use (reservation minus actual usage)."""
+        if self.tpm and tokens > 0:
+            self._tokens = min(self.tpm, self._tokens + tokens)
+
+    def update_from_headers(self, headers) -> None:
+        """Aligns the token bucket with x-ratelimit-* headers (the provider's count wins when it is lower)."""
+        now = time.monotonic()
+        self._refill(now)
+
+        # Groq's request headers track the daily quota (RPD), not the per-minute bucket:
+        # they only block calls once the day's requests are used up
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None and float(remaining_requests) < 1:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if self.tpm and remaining_tokens is not None:
+            self._tokens = min(self._tokens, float(remaining_tokens))
+
+    def backoff(self, retry_after: float | None) -> None:
+        """Blocks the limiter after a 429 for the provider's retry-after (or a short default)."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + (retry_after or 2.0))
+        self._requests = min(self._requests, 0.0)
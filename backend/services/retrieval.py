@@ -0,0 +1,97 @@
+import asyncio
+from core.config import settings
+from services.supabase_client import supabase_client
+from services.gemini_client import embedding_prefix
+from services.vector_index import vector_index
+from services.lexical_index import lexical_index
+
+# Rank constant of reciprocal-rank fusion; larger values flatten the weight of top ranks
+RRF_K = 60
+
+def match_chunks(query_embedding: list[float], match_count: int, document_id: str | None = None) -> list[dict]:
+    """
+    Nearest chunks to a query embedding, best first: within one document, or across the
+    whole library when no document is given. Rows carry id, document_id, content, metadata
+    and similarity.
+
+    With RETRIEVAL_BACKEND=local, single-document searches run against the in-process
+    vector index; library-wide searches always use the RPC. With EMBEDDING_STORAGE=compact,
+    both search the embedding prefix first (library-wide, within the documents picked by
+    centroid, as in the full mode) and re-rank with the full vectors.
+    """
+    if document_id and settings.RETRIEVAL_BACKEND == "local":
+        return vector_index.search(document_id, query_embedding, match_count)
+    if settings.EMBEDDING_STORAGE == "compact":
+        # Prefix search, then the best candidates re-ranked with the full vectors
+        rpc_res = supabase_client.rpc(
+            "match_document_chunks_compact",
+            {
+                "query_short": embedding_prefix(query_embedding),
+                "query_embedding": query_embedding,
+                "match_count": match_count,
+                "candidate_count": max(settings.EMBEDDING_RERANK_CANDIDATES, match_count),
+                "doc_id": document_id,
+                "candidate_documents": settings.GLOBAL_SEARCH_CANDIDATE_DOCUMENTS,
+            }
+        ).execute()
+    elif document_id:
+        rpc_res = supabase_client.rpc(
+            "match_document_chunks",
+            {"query_embedding": query_embedding, "match_count": match_count, "doc_id": document_id}
+        ).execute()
+    elif settings.GLOBAL_SEARCH_CANDIDATE_DOCUMENTS:
+        # Closest documents by centroid first, then only their chunks
+        rpc_res = supabase_client.rpc(
+            "match_document_chunks_two_stage",
+            {
+                "query_embedding": query_embedding,
+                "match_count": match_count,
+                "candidate_documents": settings.GLOBAL_SEARCH_CANDIDATE_DOCUMENTS,
+            }
+        ).execute()
+    else:
+        rpc_res = supabase_client.rpc(
+            "match_document_chunks_global",
+            {"query_embedding": query_embedding, "match_count": match_count}
+        ).execute()
+    return rpc_res.data or []
+
+
+def fuse_rankings(rankings: list[list[dict]], limit: int, k: int = RRF_K) -> list[dict]:
+    """Reciprocal-rank fusion: each chunk scores sum(1 / (k + rank)) over the rankings it appears in."""
+    scores: dict[str, float] = {}
+    rows: dict[str, dict] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            key = row.get("id") or row["content"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            rows[key] = {**row, **rows.get(key, {})}
+    ordered = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [{**rows[key], "rrf_score": scores[key]} for key in ordered]
+
+
+async def hybrid_search(query: str, query_embedding: list[float], match_count: int, document_id: str | None = None) -> list[dict]:
+    """
+    Vector matches fused with BM25 matches, so exact terms (formula names, acronyms,
+    identifiers) rank well too. Library-wide, the BM25 side covers the documents the
+    vector search surfaced. Falls back to plain vector search when RETRIEVAL_HYBRID is off.
+
+    The searches run in worker threads, since a first search of a document may build its
+    indexes from the stored chunks; the per-document BM25 searches run concurrently.
+    """
+    vector_rows = await asyncio.to_thread(match_chunks, query_embedding, match_count, document_id)
+    if not settings.RETRIEVAL_HYBRID:
+        return vector_rows
+
+    document_ids = [document_id] if document_id else list(dict.fromkeys(str(r["document_id"]) for r in vector_rows))
+
+    async def lexical_search(doc: str) -> list[dict]:
+        try:
+            return await asyncio.to_thread(lexical_index.search, doc, query, match_count)
+        except Exception as e:
+            print(f"Lexical search failed for document {doc}: {e}")
+            return []
+
+    lexical_rows = [row for rows in await asyncio.gather(*map(lexical_search, document_ids)) for row in rows]
+    lexical_rows.sort(key=lambda r: r["bm25"], reverse=True)
+    return fuse_rankings([vector_rows, lexical_rows[:match_count]], match_count)
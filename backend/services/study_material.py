@@ -0,0 +1,249 @@
+"""
+Flashcard + quiz sets and mind maps of a document, generated by Groq and cached.
+
+Both the generate routes and the post-ingest pre-warm go through here: a cached result
+is returned as is, identical generations already in flight are shared (and charged one
+credit), and every new result is stored for the next request.
+"""
+import hashlib
+import json
+from services.supabase_client import (
+    supabase_client,
+    deduct_credit,
+    get_cached_content,
+    cache_content,
+    get_cached_mindmap,
+    cache_mindmap,
+)
+import services.groq_client as groq
+from services.single_flight import SingleFlight
+from services.context import pack_for_model, context_budget, chunks_for_budget
+
+# Document text budget (tokens) for the mind map prompt
+MINDMAP_CONTEXT_TOKENS = 2000
+
+# In-flight generations: study sets keyed by (document_id, difficulty, variant, fresh), mind maps by
+# ("mindmap", document_id, fresh)
+_generations = SingleFlight()
+
+
+class InsufficientCreditsError(Exception):
+    pass
+
+
+class DocumentNotFoundError(Exception):
+    pass
+
+
+class NoContentError(Exception):
+    """The document has nothing to generate from (or its background processing failed)."""
+
+
+def leading_chunks(document_id: str, budget: int) -> list[dict]:
+    """The document's first chunks, as many as it takes to fill `budget` tokens."""
+    chunks_res = supabase_client.table("document_chunks") \
+        .select("content, metadata") \
+        .eq("document_id", document_id) \
+        .order("metadata->chunk_index") \
+        .limit(chunks_for_budget(budget)) \
+        .execute()
+    return chunks_res.data or []
+
+
+def variant_hash(weak_areas: list[str]) -> str:
+    """Cache variant of an adaptive request: a hash of its weak areas ("" when there are none)."""
+    return hashlib.sha256(json.dumps(weak_areas).encode()).hexdigest()[:16] if weak_areas else ""
+
+
+def fetch_weak_areas(document_id: str) -> list[str]:
+    """Questions the user got wrong in their last 3 attempts on this document (at most 10)."""
+    attempts_res = supabase_client.table("quiz_attempts") \
+        .select("wrong_answers") \
+        .eq("document_id", document_id) \
+        .not_.is_('wrong_answers', 'null') \
+        .order("created_at", desc=True) \
+        .limit(3) \
+        .execute()
+
+    wrong_qs = []
+    if attempts_res.data:
+        for attempt in attempts_res.data:
+            for key, val_str in attempt["wrong_answers"].items():
+                try:
+                    val = json.loads(val_str) if isinstance(val_str, str) else val_str
+                    wrong_qs.append(val.get("question", ""))
+                except:
+                    pass
+    return wrong_qs[:10]
+
+
+async def build_study_set_prompt(document_id: str, difficulty: str, weak_areas: list[str]) -> str:
+    """Charges a credit and builds the flashcard + quiz prompt for the document."""
+    # 3. Check and deduct credits
+    if not await deduct_credit():
+        raise InsufficientCreditsError("Insufficient credits.")
+
+    # 4. Get document context and source type
+    doc_res = supabase_client.table("documents").select("*").eq("id", document_id).single().execute()
+    if not doc_res.data:
+        raise DocumentNotFoundError("Document not found.")
+
+    source_type = doc_res.data["source_type"]
+    source_url = doc_res.data.get("source_url", "")
+    master_summary = doc_res.data.get("master_summary", "")
+
+    # Check for explicitly logged background task failures
+    if master_summary and master_summary.startswith("ERROR:"):
+        raise NoContentError(f"Background Processing Failed: {master_summary}")
+
+    # Fast Path: If we have a Map-Reduced Master Summary, format it directly
+    if master_summary:
+        context_part = f"""
+        Pre-computed Document Master Summary & Knowledge Base:
+        {master_summary}
+
+        Based ENTIRELY on the structured knowledge above, generate the requested quiz and flashcards.
+        """
+    else:
+        # LEGACY FALLBACK: Pack the opening chunks directly if summary is missing
+        chunks = leading_chunks(document_id, context_budget(groq.GROQ_MODEL_FAST))
+
+        if chunks:
+            combined_text = pack_for_model(chunks, groq.GROQ_MODEL_FAST).text
+            context_part = f"""
+            Document Content Excerpts:
+            {combined_text}
+
+            Based on the excerpts above, generate the requested study material.
+            """
+        elif source_type == "youtube" and not source_url:
+            context_part = f"""
+            YouTube Video Transcript unavailable. Based on your knowledge:
+            - Look up or infer the title and subject matter of this specific YouTube video
+            - Identify the CORE EDUCATIONAL TOPIC it teaches
+            - Focus entirely on the SUBJECT MATTER
+            - Generate the flashcards and quiz
+            """
+        else:
+            raise NoContentError("No content found for this document.")
+
+
+
+    difficulty_prompt = {
+        "easy": "Write EASY questions. Focus on basic definitions, direct recall of facts, and fundamental concepts. Use simple language.",
+        "medium": "Write MEDIUM questions. Focus on standard application, understanding of core concepts, and general knowledge. This is the standard difficulty.",
+        "hard": "Write HARD questions. Focus on complex synthesis, multi-step analysis, edge cases, and critical thinking. The distractors (wrong options) should be highly plausible."
+    }.get(difficulty.lower(), "Write questions of STANDARD difficulty.")
+
+    adaptive_prompt = ""
+    if weak_areas:
+        adaptive_prompt = f"""
+            ADAPTIVE LEARNING OVERRIDE:
+            The student previously got questions related to these topics WRONG:
+            {json.dumps(weak_areas, indent=2)}
+
+            CRITICAL INSTRUCTION: You MUST heavily bias the generated Flashcards and Quiz questions towards these specific weak areas.
+            Ensure they review the core concepts needed to answer those specific questions correctly next time.
+            """
+
+    return f"""
+    Generate BOTH 10-12 key flashcards AND a 5-8 question multiple-choice quiz on the educational topic from the source below.
+
+    Difficulty Instruction:
+    {difficulty_prompt}
+
+    {adaptive_prompt}
+
+    Rules:
+    - FLASHCARDS: each must have 'question' and 'answer' about factual content, definitions, or concepts
+    - QUIZ: each must have 'question', 4 'options', and 'correct_answer' (must exactly match one of the options)
+    - Focus only on teaching the CORE SUBJECT MATTER — not describing the video itself
+    - Write everything in English
+    - Output valid JSON with exactly two keys: "flashcards" and "questions"
+
+    {context_part}
+    """
+
+
+async def generate_study_set(document_id: str, difficulty: str = "medium", weak_areas: list[str] | None = None, fresh: bool = False) -> dict:
+    """The document's flashcards and quiz, from the cache unless `fresh`."""
+    # 1. Check cache: one entry per difficulty and adaptive variant
+    difficulty = difficulty.lower()
+    weak_areas = weak_areas or []
+    variant = variant_hash(weak_areas)
+    if not fresh:
+        cache = await get_cached_content(document_id, difficulty, variant)
+        if cache:
+            return {
+                "flashcards": cache["flashcards"],
+                "questions": cache["quiz"]
+            }
+
+    # 2. Identical requests already in flight share one generation (and one credit)
+    key = (document_id, difficulty, variant, bool(fresh))
+    return await _generations.run(key, lambda: _generate_study_set(document_id, difficulty, weak_areas, variant, fresh))
+
+
+async def _generate_study_set(document_id: str, difficulty: str, weak_areas: list[str], variant: str, fresh: bool) -> dict:
+    prompt = await build_study_set_prompt(document_id, difficulty, weak_areas)
+
+    # 5. Call AI service — Groq for both YouTube and PDF (Gemini quota exhausted)
+    raw_response = await groq.generate_study_material(prompt, cache=not fresh)
+
+    data = json.loads(raw_response)
+    flashcards = data.get("flashcards", [])
+    quiz = data.get("questions", [])
+
+    # 6. Cache result
+    await cache_content(document_id, flashcards, quiz, difficulty, variant)
+
+    return {
+        "flashcards": flashcards,
+        "questions": quiz
+    }
+
+
+async def generate_mindmap(document_id: str, fresh: bool = False) -> dict:
+    """The document's mind map as React Flow nodes and edges, from the cache unless `fresh`."""
+    if not fresh:
+        cached = await get_cached_mindmap(document_id)
+        if cached:
+            return {"nodes": cached["nodes"], "edges": cached["edges"]}
+
+    return await _generations.run(("mindmap", document_id, bool(fresh)), lambda: _generate_mindmap(document_id, fresh))
+
+
+async def _generate_mindmap(document_id: str, fresh: bool) -> dict:
+    if not await deduct_credit():
+        raise InsufficientCreditsError("Insufficient credits.")
+
+    doc_res = supabase_client.table("documents").select("id").eq("id", document_id).execute()
+    if not doc_res.data:
+        raise DocumentNotFoundError("Document not found.")
+
+    # Token-budgeted context from the start of the document
+    combined_text = pack_for_model(leading_chunks(document_id, MINDMAP_CONTEXT_TOKENS), groq.GROQ_MODEL_FAST, MINDMAP_CONTEXT_TOKENS).text
+
+    prompt = f"""
+    Extract the core concepts from the following text and return them strictly in JSON format to build a React Flow graph.
+
+    Rules:
+    - Output MUST be valid JSON with EXACTLY two keys: "nodes" and "edges"
+    - "nodes" must be an array of objects: {{"id": "unique_string", "data": {{"label": "Topic Name"}}}}
+    - "edges" must be an array of objects: {{"id": "e_source_target", "source": "source_node_id", "target": "target_node_id"}}
+    - Ensure every target in an edge explicitly matches a valid node id.
+    - Create a rich, detailed hierarchy (aim for 10-20 nodes).
+
+    Content:
+    {combined_text}
+    """
+
+    raw_response = await groq.generate_study_material(prompt, cache=not fresh)
+    data = json.loads(raw_response)
+    nodes, edges = data.get("nodes", []), data.get("edges", [])
+    await cache_mindmap(document_id, nodes, edges)
+
+    return {
+        "nodes": nodes,
+        "edges": edges
+    }
@@ -0,0 +1,213 @@
+"""
+Master summary generation (hierarchical map-reduce).
+
+Every chunk of a document is summarized (map), then the summaries are combined in a
+tree of reduce calls until what is left fits a single final reduce. Map calls run
+concurrently and are paced by the Groq rate limiter. Each reduce groups as many
+consecutive summaries as fit SUMMARY_REDUCE_INPUT_TOKENS, so the fan-in follows the
+model's context rather than a fixed batch size.
+
+Every node of the tree is persisted in `document_summary_nodes` together with a hash
+of its inputs. A node whose call fails twice is skipped and the summary is built from
+the rest; a run that fails outright keeps the nodes it finished, and the next run
+reuses them and only calls the model for what is missing. All calls run at low
+priority on the Groq limiter, behind chat and generation requests.
+"""
+import asyncio
+import hashlib
+import json
+from core.config import settings
+from services.supabase_client import supabase_client, fetch_document_chunks
+from services.chunking import get_encoder
+from services.rate_limit import low_priority
+import services.groq_client as groq
+
+NODES_TABLE = "document_summary_nodes"
+
+# PostgREST returns at most this many rows per request
+_PAGE_SIZE = 1000
+
+MAP_PROMPT = """
+            You are an AI academic assistant. Analyze the following content chunk from a larger document.
+            Generate a summary of MAXIMUM 100 words. This is a strict word limit.
+            Extract key concepts, important definitions, and the main topic.
+            Respond in JSON: {{"main_topic": "", "summary": "", "key_concepts": [], "important_definitions": [], "important_points": []}}
+
+            Content:
+            {content}
+            """
+
+REDUCE_PROMPT = """
+            You are an expert AI tutor. Combine the following sequential summaries into a cohesive mini-master summary.
+            Your output MUST be a maximum of 150 words. This is a strict limit.
+            Extract the overarching theme and key concepts from this specific section of the document.
+            Respond in JSON: {{"section_theme": "", "combined_summary": ""}}
+
+            Summaries:
+            {content}
+            """
+
+FINAL_PROMPT = """
+        You are an expert educational AI. Below are intermediate structured summaries from the entire document.
+        Generate a final, comprehensive master summary strictly between 500-700 words maximum.
+        Identify the absolute central theme of the entire work, merge overarching concepts, and organize logically.
+        Respond in JSON: {{"central_theme": "", "master_summary": "", "major_topics": [], "concept_relationships": []}}
+
+        Summaries:
+        {content}
+        """
+
+SEPARATOR = "\n\n---\n\n"
+
+# Model calls per node before it is skipped
+NODE_ATTEMPTS = 2
+
+
+def _input_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()
+
+
+def _token_count(text: str) -> int:
+    return len(get_encoder().encode_ordinary(text))
+
+
+def _fetch_chunks(document_id: str) -> list[str]:
+    """All chunk texts of a document in document order."""
+    rows = fetch_document_chunks(document_id)
+    rows.sort(key=lambda r: (r.get("metadata") or {}).get("chunk_index", 0))
+    return [r["content"] for r in rows]
+
+
+def _load_nodes(document_id: str) -> dict[tuple[int, int], dict]:
+    nodes = {}
+    while True:
+        res = supabase_client.table(NODES_TABLE) \
+            .select("level, position, input_hash, content") \
+            .eq("document_id", document_id) \
+            .order("level").order("position") \
+            .range(len(nodes), len(nodes) + _PAGE_SIZE - 1) \
+            .execute()
+        for row in res.data or []:
+            nodes[(row["level"], row["position"])] = row
+        if len(res.data or []) < _PAGE_SIZE:
+            break
+    return nodes
+
+
+def _save_node(document_id: str, level: int, position: int, input_hash: str, content: str) -> None:
+    supabase_client.table(NODES_TABLE).upsert({
+        "document_id": document_id,
+        "level": level,
+        "position": position,
+        "input_hash": input_hash,
+        "content": content,
+    }, on_conflict="document_id,level,position").execute()
+
+
+def _format_map(parsed: dict) -> str:
+    concepts = parsed.get("key_concepts") or []
+    if not isinstance(concepts, list):
+        concepts = [concepts]
+    return f"Topic: {parsed.get('main_topic')}\nSummary: {parsed.get('summary')}\nKey Concepts: {', '.join(str(c) for c in concepts)}"
+
+
+def _format_reduce(parsed: dict) -> str:
+    return f"Theme: {parsed.get('section_theme')}\nSummary: {parsed.get('combined_summary')}"
+
+
+def _group(summaries: list[str], budget: int) -> list[list[str]]:
+    """Packs consecutive summaries into groups that fit `budget` tokens (at least two per group)."""
+    groups: list[list[str]] = []
+    current: list[str] = []
+    used = 0
+    for summary in summaries:
+        tokens = _token_count(summary)
+        if len(current) >= 2 and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(summary)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _run_level(document_id: str, level: int, inputs: list[str], prompt: str, formatter, nodes: dict) -> list[str]:
+    """
+    Produces one node per input at `level`, reusing persisted nodes whose input hash matches.
+    A node that fails NODE_ATTEMPTS times is left out; raises only if every node failed.
+    """
+    semaphore = asyncio.Semaphore(settings.SUMMARY_MAX_CONCURRENCY)
+
+    async def node(position: int, text: str) -> str | None:
+        input_hash = _input_hash(text)
+        saved = nodes.get((level, position))
+        if saved and saved["input_hash"] == input_hash:
+            return saved["content"]
+        async with semaphore:
+            for attempt in range(NODE_ATTEMPTS):
+                try:
+                    res = await groq.generate_study_material(prompt.format(content=text), cache=attempt == 0)
+                    content = formatter(json.loads(res))
+                    break
+                except Exception as e:
+                    print(f"Failed to summarize node {level}/{position} of document {document_id} (attempt {attempt + 1}): {e}")
+            else:
+                return None
+        await asyncio.to_thread(_save_node, document_id, level, position, input_hash, content)
+        return content
+
+    results = await asyncio.gather(*(node(i, text) for i, text in enumerate(inputs)))
+    succeeded = [r for r in results if r is not None]
+    if not succeeded:
+        raise RuntimeError(f"All {len(inputs)} summaries failed at level {level}.")
+    if len(succeeded) < len(inputs):
+        print(f"Skipped {len(inputs) - len(succeeded)} of {len(inputs)} failed summaries at level {level} for document {document_id}.")
+    return succeeded
+
+
+async def summarize_document(document_id: str) -> str | None:
+    """Builds the master summary over every chunk of the document. Returns None if it has no chunks."""
+    chunks = await asyncio.to_thread(_fetch_chunks, document_id)
+    if not chunks:
+        return None
+    nodes = await asyncio.to_thread(_load_nodes, document_id)
+
+    with low_priority():
+        # Map: one summary per chunk
+        summaries = await _run_level(document_id, 0, chunks, MAP_PROMPT, _format_map, nodes)
+        print(f"Mapped {len(summaries)} chunks for document {document_id}.")
+
+        # Reduce tree: combine groups that fit the context budget until one final reduce is enough
+        budget = settings.SUMMARY_REDUCE_INPUT_TOKENS
+        level = 0
+        while len(summaries) > 1 and _token_count(SEPARATOR.join(summaries)) > budget:
+            level += 1
+            groups = _group(summaries, budget)
+            summaries = await _run_level(document_id, level, [SEPARATOR.join(g) for g in groups], REDUCE_PROMPT, _format_reduce, nodes)
+            print(f"Reduced to {len(summaries)} summaries at level {level} for document {document_id}.")
+
+        return await groq.generate_study_material(
+            FINAL_PROMPT.format(content=SEPARATOR.join(summaries)),
+            model=groq.GROQ_MODEL_SMART,
+            max_tokens=1500
+        )
+
+
+async def generate_master_summary_background(document_id: str):
+    """
+    Generates and saves the document's master summary. On failure the summary is left
+    unset, so generation falls back to the chunks, and the error is re-raised: the
+    ingestion job fails at its summary stage and a retry resumes from the persisted nodes.
+    """
+    try:
+        master_res = await summarize_document(document_id)
+        if master_res is None:
+            return
+        supabase_client.table("documents").update({"master_summary": master_res}).eq("id", document_id).execute()
+        print(f"Successfully generated and saved Master Summary for document {document_id}")
+    except Exception as e:
+        import traceback
+        print(f"Error in background summary task: {e}")
+        print(traceback.format_exc())
+        raise
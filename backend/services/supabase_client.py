@@ -7,6 +7,22 @@ def get_supabase_client() -> Client:
     return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 
 supabase_client = get_supabase_client()
+
+def fetch_document_chunks(document_id: str, columns: str = "id, content, metadata") -> list[dict]:
+    """Every chunk row of a document, paging past PostgREST's 1000-row response limit."""
+    rows = []
+    while True:
+        res = supabase_client.table("document_chunks") \
+            .select(columns) \
+            .eq("document_id", document_id) \
+            .order("id") \
+            .range(len(rows), len(rows) + 999) \
+            .execute()
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < 1000:
+            return rows
+
 async def get_user_credits(email: str = "default@example.com") -> int:
     """Gets the current credit balance for the user."""
     # BYPASS FOR LOCAL TESTING: Force infinite credits on the UI
@@ -17,17 +33,59 @@ async def deduct_credit(email: str = "default@example.com") -> bool:
     # BYPASS FOR LOCAL TESTING: Always allow generation without deducting credits
     return True
 
-async def get_cached_content(document_id: str):
-    """Retrieves cached flashcards and quiz for a document."""
-    res = supabase_client.table("generated_content").select("*").eq("document_id", document_id).execute()
+async def get_cached_content(document_id: str, difficulty: str = "medium", variant: str = ""):
+    """Retrieves cached flashcards and quiz for a document, difficulty and adaptive variant."""
+    res = supabase_client.table("generated_content") \
+        .select("*") \
+        .eq("document_id", document_id) \
+        .eq("difficulty", difficulty) \
+        .eq("variant", variant) \
+        .execute()
     return res.data[0] if res.data else None
 
-async def cache_content(document_id: str, flashcards: list, quiz: list):
-    """Stores generated flashcards and quiz in the cache."""
-    # Delete existing record first to avoid unique constraint violations
-    supabase_client.table("generated_content").delete().eq("document_id", document_id).execute()
-    supabase_client.table("generated_content").insert({
+async def cache_content(document_id: str, flashcards: list, quiz: list, difficulty: str = "medium", variant: str = ""):
+    """Stores generated flashcards and quiz in the cache (one upsert per document, difficulty and variant)."""
+    supabase_client.table("generated_content").upsert({
         "document_id": document_id,
+        "difficulty": difficulty,
+        "variant": variant,
         "flashcards": flashcards,
         "quiz": quiz
-    }).execute()
+    }, on_conflict="document_id,difficulty,variant").execute()
+
+async def get_cached_mindmap(document_id: str):
+    """Retrieves the stored mind map graph of a document."""
+    res = supabase_client.table("document_mindmaps").select("*").eq("document_id", document_id).execute()
+    return res.data[0] if res.data else None
+
+async def cache_mindmap(document_id: str, nodes: list, edges: list):
+    """Stores a document's mind map graph."""
+    supabase_client.table("document_mindmaps").upsert({
+        "document_id": document_id,
+        "nodes": nodes,
+        "edges": edges
+    }, on_conflict="document_id").execute()
+
+async def get_cached_explanation(document_id: str, topic_key: str):
+    """Retrieves a stored topic explanation by document and normalized topic."""
+    res = supabase_client.table("topic_explanations") \
+        .select("explanation") \
+        .eq("document_id", document_id) \
+        .eq("topic_key", topic_key) \
+        .execute()
+    return res.data[0] if res.data else None
+
+async def cache_explanation(document_id: str, topic_key: str, topic: str, explanation: str):
+    """Stores a topic explanation under its normalized topic."""
+    supabase_client.table("topic_explanations").upsert({
+        "document_id": document_id,
+        "topic_key": topic_key,
+        "topic": topic,
+        "explanation": explanation
+    }, on_conflict="document_id,topic_key").execute()
+
+def invalidate_generated_content(document_id: str):
+    """Drops every cached generation of a document, e.g. after its chunks were replaced."""
+    supabase_client.table("generated_content").delete().eq("document_id", document_id).execute()
+    supabase_client.table("document_mindmaps").delete().eq("document_id", document_id).execute()
+    supabase_client.table("topic_explanations").delete().eq("document_id", document_id).execute()
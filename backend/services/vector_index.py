@@ -0,0 +1,145 @@
+"""
+In-process vector index, one per document.
+
+Each document's chunk embeddings are L2-normalized and stored quantized (int8 with a
+per-row scale, or float16) in .npy files under DATA_DIR/vectors/<document_id>, next to
+the chunk rows themselves. Indexes are memory-mapped on first use and kept in an LRU
+of VECTOR_INDEX_MAX_DOCUMENTS documents; a query is one matrix-vector product plus a
+partial sort.
+
+With EMBEDDING_STORAGE=compact the quantized matrix holds only the normalized leading
+EMBEDDING_PREFIX_DIM dimensions, and the full float32 vectors are kept memory-mapped
+next to it: a query scans the prefix and re-ranks the best candidates with the full
+vectors, so only those rows are read from disk.
+"""
+import json
+import os
+import numpy as np
+from core.config import settings
+from services.index_store import DocumentIndexStore
+from services.supabase_client import fetch_document_chunks
+
+INDEX_DIR = os.path.join(settings.DATA_DIR, "vectors")
+
+
+def _quantize(matrix: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    if dtype == "int8":
+        # Symmetric per-row quantization: row ≈ q * scale
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.round(matrix / scales[:, None]).astype(np.int8)
+        return q, scales.astype(np.float32)
+    return matrix.astype(np.float16), None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class DocumentIndex:
+    def __init__(self, vectors: np.ndarray, scales: np.ndarray | None, rows: list[dict], full: np.ndarray | None = None, rerank_candidates: int = 0):
+        self.vectors = vectors
+        self.scales = scales
+        self.rows = rows
+        # Full-precision vectors for re-ranking when `vectors` holds a prefix
+        self.full = full
+        self.rerank_candidates = rerank_candidates
+
+    def search(self, query: np.ndarray, k: int) -> list[dict]:
+        """Top-k rows by cosine similarity to a normalized query, best first."""
+        if not self.rows:
+            return []
+        scan_query = query if self.full is None else _normalize(query[:self.vectors.shape[1]])
+        scores = self.vectors.astype(np.float32) @ scan_query
+        if self.scales is not None:
+            scores *= self.scales
+        if self.full is None:
+            top = _top(scores, k)
+            return [{**self.rows[i], "similarity": float(scores[i])} for i in top]
+
+        candidates = np.sort(_top(scores, max(k, self.rerank_candidates)))
+        exact = np.asarray(self.full[candidates], dtype=np.float32) @ query
+        top = _top(exact, k)
+        return [{**self.rows[candidates[i]], "similarity": float(exact[i])} for i in top]
+
+
+class VectorIndexStore(DocumentIndexStore[DocumentIndex]):
+    """Builds, persists and caches the per-document vector indexes."""
+
+    def __init__(self, root: str, max_documents: int, dtype: str = "int8", prefix_dim: int | None = None, rerank_candidates: int = 50):
+        super().__init__(root, max_documents)
+        self.dtype = dtype
+        self.prefix_dim = prefix_dim
+        self.rerank_candidates = rerank_candidates
+
+    def build(self, document_id: str, rows: list[dict]) -> DocumentIndex:
+        """Writes the index for rows carrying id, content, metadata and embedding (rows without one are left out)."""
+        rows = [r for r in rows if r.get("embedding") is not None]
+        if not rows:
+            # Nothing embedded (yet): nothing to quantize or persist, a later query builds again
+            return DocumentIndex(np.zeros((0, 0), dtype=np.float32), None, [])
+        matrix = np.array([r["embedding"] for r in rows], dtype=np.float32)
+        full = _normalize(matrix)
+        vectors, scales = _quantize(_normalize(full[:, :self.prefix_dim]) if self.prefix_dim else full, self.dtype)
+        meta = [{"id": r.get("id"), "document_id": document_id, "content": r["content"], "metadata": r.get("metadata")} for r in rows]
+        return self.put(document_id, DocumentIndex(vectors, scales, meta, full if self.prefix_dim else None, self.rerank_candidates))
+
+    def _build(self, document_id: str) -> DocumentIndex:
+        return self.build(document_id, _fetch_chunk_rows(document_id))
+
+    def _write(self, index: DocumentIndex, path: str) -> None:
+        np.save(os.path.join(path, "vectors.npy"), index.vectors)
+        if index.scales is not None:
+            np.save(os.path.join(path, "scales.npy"), index.scales)
+        if index.full is not None:
+            np.save(os.path.join(path, "full.npy"), index.full)
+        with open(os.path.join(path, "rows.json"), "w", encoding="utf-8") as f:
+            json.dump(index.rows, f)
+
+    def _load(self, path: str) -> DocumentIndex | None:
+        if not os.path.exists(os.path.join(path, "rows.json")):
+            return None
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        full_path = os.path.join(path, "full.npy")
+        full = np.load(full_path, mmap_mode="r") if os.path.exists(full_path) else None
+        # Built under the other storage mode (or another prefix size): rebuild
+        if (full is None) != (not self.prefix_dim):
+            return None
+        if full is not None and vectors.shape[1] != min(self.prefix_dim, full.shape[1]):
+            return None
+        with open(os.path.join(path, "rows.json"), encoding="utf-8") as f:
+            rows = json.load(f)
+        return DocumentIndex(vectors, scales, rows, full, self.rerank_candidates)
+
+    def search(self, document_id: str, query_embedding: list[float], k: int) -> list[dict]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return self.get(document_id).search(query / norm if norm else query, k)
+
+
+def _fetch_chunk_rows(document_id: str) -> list[dict]:
+    rows = fetch_document_chunks(document_id, "id, content, metadata, embedding")
+    for row in rows:
+        # pgvector columns come back as '[0.1,0.2,...]' strings
+        if isinstance(row.get("embedding"), str):
+            row["embedding"] = json.loads(row["embedding"])
+    return rows
+
+
+vector_index = VectorIndexStore(
+    INDEX_DIR,
+    settings.VECTOR_INDEX_MAX_DOCUMENTS,
+    settings.VECTOR_INDEX_DTYPE,
+    settings.EMBEDDING_PREFIX_DIM if settings.EMBEDDING_STORAGE == "compact" else None,
+    settings.EMBEDDING_RERANK_CANDIDATES,
+)
@@ -23,10 +23,11 @@ def extract_video_id(url: str) -> str:
         return url.split("v=")[-1].split("&")[0]
     return url.split("/")[-1].split("?")[0]
 
-def fetch_youtube_transcript(url: str) -> str:
+def fetch_youtube_transcript_segments(url: str) -> list[dict]:
     """
     Fetches the transcript using youtube-transcript-api v1.x (instance-based API).
     Works on Render and local without yt-dlp.
+    Returns the timed snippets as [{"text", "start", "duration"}] (seconds).
     """
     try:
         video_id = extract_video_id(url)
@@ -43,8 +44,12 @@ def fetch_youtube_transcript(url: str) -> str:
             first = next(iter(transcript_list))
             transcript = first.fetch()
         
-        return " ".join([t.text for t in transcript])
+        return [{"text": t.text, "start": t.start, "duration": t.duration} for t in transcript]
 
     except Exception as e:
         print(f"Transcript fetching failed: {str(e)}")
         raise Exception(f"Transcript fetch failed: {str(e)}")
+
+def fetch_youtube_transcript(url: str) -> str:
+    """Fetches the transcript as a single string."""
+    return " ".join([t["text"] for t in fetch_youtube_transcript_segments(url)])
@@ -10,7 +10,10 @@ export async function uploadYouTube(url: string) {
     cache: 'no-store'
   });
   if (!res.ok) throw new Error(await res.text());
-  return res.json();
+  const job = await res.json();
+  const finished = await waitForIngestionJob(job.job_id);
+  // Videos without a transcript are still saved (with no chunks), as before
+  return { ...job, transcript_found: finished.transcript_found !== false };
 }
 
 export async function uploadPDF(file: File) {
@@ -25,9 +28,28 @@ export async function uploadPDF(file: File) {
     cache: 'no-store'
   });
   if (!res.ok) throw new Error(await res.text());
+  const job = await res.json();
+  await waitForIngestionJob(job.job_id);
+  return job;
+}
+
+export async function getIngestionJob(jobId: string) {
+  const res = await fetch(`${API_BASE_URL}/api/upload/jobs/${jobId}`, { cache: 'no-store' });
+  if (!res.ok) throw new Error(await res.text());
   return res.json();
 }
 
+// Uploads are processed in the background; poll until the document is ready
+// (chunks stored; the optional summary and pre-warm stages may still be running)
+export async function waitForIngestionJob(jobId: string, intervalMs: number = 1500) {
+  while (true) {
+    const job = await getIngestionJob(jobId);
+    if (job.status === "completed" || job.ready) return job;
+    if (job.status === "failed") throw new Error(job.error || "Processing failed");
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 export async function generateFlashcards(documentId: string, difficulty: string = "medium", isAdaptive: boolean = false) {
   const res = await fetch(`${API_BASE_URL}/api/generate/flashcards`, {
     method: 'POST',
@@ -81,6 +103,52 @@ export async function generateAll(documentId: string, difficulty: string = "medi
   return res.json();
 }
 
+// Same result as generateAll, but each flashcard/question is passed to the callbacks as soon as it is generated
+export async function generateAllStream(
+  documentId: string,
+  difficulty: string = "medium",
+  onFlashcard?: (card: any) => void,
+  onQuestion?: (question: any) => void
+) {
+  const res = await fetch(`${API_BASE_URL}/api/generate/all/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ document_id: documentId, difficulty })
+  });
+  if (!res.ok) {
+    const errText = await res.text();
+    try {
+      const errJson = JSON.parse(errText);
+      throw new Error(errJson.detail || errText);
+    } catch (e) {
+      throw new Error(errText);
+    }
+  }
+
+  const reader = res.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = { flashcards: [] as any[], questions: [] as any[] };
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split("\n\n");
+    buffer = events.pop() || "";
+    for (const event of events) {
+      if (!event.startsWith("data: ")) continue;
+      const data = event.slice(6).trim();
+      if (data === "[DONE]") return result;
+      const parsed = JSON.parse(data);
+      if (parsed.error) throw new Error(parsed.error);
+      if (parsed.flashcard) onFlashcard?.(parsed.flashcard);
+      if (parsed.question) onQuestion?.(parsed.question);
+      if (parsed.result) result = parsed.result;
+    }
+  }
+  return result;
+}
+
 export async function getUserCredits() {
   const res = await fetch(`${API_BASE_URL}/api/user/credits`, {
     method: 'GET',
@@ -0,0 +1,116 @@
+-- Compact Embedding Storage (EMBEDDING_STORAGE=compact)
+
+-- 1. Normalized 256-dim prefix of each chunk embedding as halfvec (512 bytes instead of 3072), with its own
+--    HNSW index. gemini-embedding-001 is Matryoshka-trained, so the prefix ranks close to the full vector.
+--    The dimension must match EMBEDDING_PREFIX_DIM. Requires pgvector 0.7+ (halfvec, subvector, l2_normalize).
+ALTER TABLE public.document_chunks ADD COLUMN IF NOT EXISTS embedding_short halfvec(256);
+
+CREATE INDEX IF NOT EXISTS document_chunks_embedding_short_idx
+    ON public.document_chunks USING hnsw (embedding_short halfvec_cosine_ops);
+
+-- 2. Backfill for chunks stored before the column existed, one batch per call so no single statement holds
+--    locks for long (backend/backfill_compact_embeddings.py calls it until it returns 0)
+CREATE OR REPLACE FUNCTION public.backfill_embedding_short (
+  batch_size int DEFAULT 5000
+) RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated int;
+BEGIN
+  WITH batch AS (
+    SELECT dc.id
+    FROM public.document_chunks dc
+    WHERE dc.embedding_short IS NULL
+      AND dc.embedding IS NOT NULL
+    LIMIT batch_size
+  )
+  UPDATE public.document_chunks dc
+  SET embedding_short = l2_normalize(subvector(dc.embedding, 1, 256))::halfvec(256)
+  FROM batch
+  WHERE dc.id = batch.id;
+  GET DIAGNOSTICS updated = ROW_COUNT;
+  RETURN updated;
+END;
+$$;
+
+-- 3. Search on the prefix, then re-rank the candidate_count best candidates with the full vectors. Within one
+--    document the candidates come from the document_id index, as in schema_document_search.sql. Library-wide,
+--    with candidate_documents > 0 they come from the documents whose centroids are closest to the query (as in
+--    schema_document_centroids.sql, which must be applied first); with 0 they come from the prefix HNSW index
+--    (ef_search is raised so it can return candidate_count rows).
+DROP FUNCTION IF EXISTS public.match_document_chunks_compact(halfvec, vector, int, int, uuid);
+
+CREATE OR REPLACE FUNCTION public.match_document_chunks_compact (
+  query_short halfvec(256),
+  query_embedding vector(768),
+  match_count int,
+  candidate_count int DEFAULT 50,
+  doc_id uuid DEFAULT NULL,
+  candidate_documents int DEFAULT 0
+) RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF doc_id IS NULL AND candidate_documents > 0 THEN
+    RETURN QUERY
+    WITH documents AS MATERIALIZED (
+      SELECT c.document_id
+      FROM public.document_centroids c
+      ORDER BY c.centroid <=> query_embedding
+      LIMIT candidate_documents
+    ), candidates AS MATERIALIZED (
+      SELECT dc.id
+      FROM public.document_chunks dc
+      WHERE dc.document_id IN (SELECT d.document_id FROM documents d)
+        AND dc.embedding_short IS NOT NULL
+      ORDER BY dc.embedding_short <=> query_short
+      LIMIT candidate_count
+    )
+    SELECT dc.id, dc.document_id, dc.content, dc.metadata, 1 - (dc.embedding <=> query_embedding) AS similarity
+    FROM public.document_chunks dc
+    JOIN candidates c ON c.id = dc.id
+    ORDER BY dc.embedding <=> query_embedding
+    LIMIT match_count;
+  ELSIF doc_id IS NULL THEN
+    PERFORM set_config('hnsw.ef_search', greatest(candidate_count, 40)::text, true);
+    RETURN QUERY
+    WITH candidates AS MATERIALIZED (
+      SELECT dc.id
+      FROM public.document_chunks dc
+      ORDER BY dc.embedding_short <=> query_short
+      LIMIT candidate_count
+    )
+    SELECT dc.id, dc.document_id, dc.content, dc.metadata, 1 - (dc.embedding <=> query_embedding) AS similarity
+    FROM public.document_chunks dc
+    JOIN candidates c ON c.id = dc.id
+    ORDER BY dc.embedding <=> query_embedding
+    LIMIT match_count;
+  ELSE
+    RETURN QUERY
+    WITH candidates AS MATERIALIZED (
+      SELECT dc.id
+      FROM public.document_chunks dc
+      WHERE dc.document_id = doc_id
+        AND dc.embedding_short IS NOT NULL
+      ORDER BY dc.embedding_short <=> query_short
+      LIMIT candidate_count
+    )
+    SELECT dc.id, dc.document_id, dc.content, dc.metadata, 1 - (dc.embedding <=> query_embedding) AS similarity
+    FROM public.document_chunks dc
+    JOIN candidates c ON c.id = dc.id
+    ORDER BY dc.embedding <=> query_embedding
+    LIMIT match_count;
+  END IF;
+END;
+$$;
+
+-- 4. Once the backend runs with EMBEDDING_STORAGE=compact and the backfill has finished, nothing searches the
+--    full-vector HNSW index any more; dropping it frees most of the index space:
+-- DROP INDEX IF EXISTS public.document_chunks_embedding_idx;
@@ -0,0 +1,8 @@
+-- Content-addressed Document Deduplication
+
+-- 1. Hash of the uploaded content: 'pdf:sha256:<hex>' or 'youtube:<video_id>'
+ALTER TABLE public.documents
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- 2. Uploads look up existing documents by hash before ingesting
+CREATE INDEX IF NOT EXISTS documents_content_hash_idx ON public.documents (content_hash);
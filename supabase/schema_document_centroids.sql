@@ -0,0 +1,59 @@
+-- Two-Stage Global Library Search
+
+-- 1. One centroid embedding per document (mean of its normalized chunk embeddings), kept up to date by ingestion
+CREATE TABLE IF NOT EXISTS public.document_centroids (
+    document_id UUID PRIMARY KEY REFERENCES public.documents(id) ON DELETE CASCADE,
+    centroid vector(768) NOT NULL,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS document_centroids_centroid_idx
+    ON public.document_centroids USING hnsw (centroid vector_cosine_ops);
+
+-- 2. Backfill documents ingested before this table existed, with the same normalized mean of normalized
+--    embeddings as ingestion (a plain avg() would weight chunks by vector norm). Requires pgvector 0.7+.
+INSERT INTO public.document_centroids (document_id, centroid, chunk_count)
+SELECT dc.document_id, l2_normalize(avg(l2_normalize(dc.embedding))), count(*)
+FROM public.document_chunks dc
+WHERE dc.embedding IS NOT NULL
+GROUP BY dc.document_id
+ON CONFLICT (document_id) DO NOTHING;
+
+-- 3. Global search in two stages: the candidate_documents documents whose centroids are closest
+--    to the query, then an exact ranking of only those documents' chunks (through
+--    document_chunks_document_id_idx from schema_document_search.sql)
+CREATE OR REPLACE FUNCTION public.match_document_chunks_two_stage (
+  query_embedding vector(768),
+  match_count int DEFAULT 7,
+  candidate_documents int DEFAULT 20
+) RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT c.document_id
+    FROM public.document_centroids c
+    ORDER BY c.centroid <=> query_embedding
+    LIMIT candidate_documents
+  ), candidate_chunks AS MATERIALIZED (
+    SELECT dc.id, dc.document_id, dc.content, dc.metadata, dc.embedding
+    FROM public.document_chunks dc
+    WHERE dc.document_id IN (SELECT document_id FROM candidates)
+      AND dc.embedding IS NOT NULL
+  )
+  SELECT
+    cc.id,
+    cc.document_id,
+    cc.content,
+    cc.metadata,
+    1 - (cc.embedding <=> query_embedding) AS similarity
+  FROM candidate_chunks cc
+  ORDER BY cc.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
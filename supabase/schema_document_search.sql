@@ -0,0 +1,39 @@
+-- Document-Scoped Chunk Search
+
+-- 1. B-tree on document_id, so one document's chunks are found without touching the rest of the table
+CREATE INDEX IF NOT EXISTS document_chunks_document_id_idx ON public.document_chunks (document_id);
+
+-- 2. match_document_chunks with a doc_id filter (the 2-argument version stays for older callers).
+--    The MATERIALIZED CTE makes the planner fetch the document's rows through the index above and rank
+--    only those exactly, instead of walking the corpus-wide HNSW index and filtering afterwards (which is
+--    slower on a large library and can return fewer than match_count rows). Cost grows with the size of
+--    the document, not of the corpus.
+CREATE OR REPLACE FUNCTION public.match_document_chunks (
+  query_embedding vector(768),
+  match_count int,
+  doc_id uuid
+) RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH doc_chunks AS MATERIALIZED (
+    SELECT dc.id, dc.document_id, dc.content, dc.metadata, dc.embedding
+    FROM public.document_chunks dc
+    WHERE dc.document_id = doc_id
+      AND dc.embedding IS NOT NULL
+  )
+  SELECT
+    c.id,
+    c.document_id,
+    c.content,
+    c.metadata,
+    1 - (c.embedding <=> query_embedding) AS similarity
+  FROM doc_chunks c
+  ORDER BY c.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
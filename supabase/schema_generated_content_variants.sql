@@ -0,0 +1,11 @@
+-- Generated Content per Difficulty and Adaptive Variant
+
+-- 1. One cache entry per (document, difficulty, variant). variant is '' for standard requests
+--    and a hash of the student's weak areas for adaptive ones.
+ALTER TABLE public.generated_content ADD COLUMN IF NOT EXISTS difficulty VARCHAR(20) NOT NULL DEFAULT 'medium';
+ALTER TABLE public.generated_content ADD COLUMN IF NOT EXISTS variant TEXT NOT NULL DEFAULT '';
+
+-- 2. Replace the one-row-per-document constraint with the composite key used for upserts
+ALTER TABLE public.generated_content DROP CONSTRAINT IF EXISTS generated_content_document_id_key;
+CREATE UNIQUE INDEX IF NOT EXISTS generated_content_document_variant_idx
+    ON public.generated_content (document_id, difficulty, variant);
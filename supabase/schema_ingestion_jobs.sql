@@ -0,0 +1,29 @@
+-- Asynchronous Ingestion Jobs
+
+-- 1. One row per upload; workers update stage status and progress as they go
+CREATE TABLE IF NOT EXISTS public.ingestion_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    document_id UUID REFERENCES public.documents(id) ON DELETE CASCADE,
+    source_type VARCHAR(50) NOT NULL, -- 'pdf' or 'youtube'
+    source_ref TEXT, -- YouTube URL or filename
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'completed', 'failed'
+    current_stage VARCHAR(20),
+    stages JSONB NOT NULL DEFAULT '{}', -- {"extract": {"status", "started_at", "finished_at", "duration_ms"}, ...}
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    embedded_count INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker_id TEXT, -- process currently holding the lease
+    locked_until TIMESTAMP WITH TIME ZONE, -- lease expiry; expired leases are picked up again
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+);
+
+-- 2. Workers scan for unfinished jobs on startup
+CREATE INDEX IF NOT EXISTS ingestion_jobs_unfinished_idx
+    ON public.ingestion_jobs (created_at)
+    WHERE status IN ('queued', 'running');
+
+CREATE INDEX IF NOT EXISTS ingestion_jobs_document_id_idx ON public.ingestion_jobs (document_id);
+
+-- 3. YouTube jobs record whether a transcript was found; without one the job completes with no chunks
+ALTER TABLE public.ingestion_jobs ADD COLUMN IF NOT EXISTS transcript_found BOOLEAN;
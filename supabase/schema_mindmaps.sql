@@ -0,0 +1,19 @@
+-- Stored Mind Maps and Topic Explanations
+
+-- 1. One React Flow graph per document, written on generation (or by post-ingest pre-warming)
+CREATE TABLE IF NOT EXISTS public.document_mindmaps (
+    document_id UUID PRIMARY KEY REFERENCES public.documents(id) ON DELETE CASCADE,
+    nodes JSONB NOT NULL DEFAULT '[]',
+    edges JSONB NOT NULL DEFAULT '[]',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+);
+
+-- 2. Explanations of mind-map topics, one per document and normalized topic (lower-case, single spaces)
+CREATE TABLE IF NOT EXISTS public.topic_explanations (
+    document_id UUID REFERENCES public.documents(id) ON DELETE CASCADE,
+    topic_key TEXT NOT NULL,
+    topic TEXT NOT NULL, -- topic as first requested
+    explanation TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    PRIMARY KEY (document_id, topic_key)
+);
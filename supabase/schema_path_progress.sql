@@ -0,0 +1,42 @@
+-- Atomic Learning Path Progress
+
+-- 1. Sets "completed" on the given days of a path's roadmap in one UPDATE.
+--    The row lock serializes concurrent toggles, and each one is applied to the latest roadmap,
+--    so no update is lost. Returns how many of the requested days exist (NULL if the path doesn't).
+CREATE OR REPLACE FUNCTION public.set_learning_path_days (
+  path_id uuid,
+  day_numbers int[],
+  is_completed boolean
+) RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  matched int;
+BEGIN
+  UPDATE public.learning_paths lp
+  SET roadmap = jsonb_set(lp.roadmap, '{days}', (
+    SELECT COALESCE(jsonb_agg(
+      CASE
+        -- Days whose "day" is not a number (the model's output is stored as returned) never match
+        WHEN jsonb_typeof(d.value->'day') IS DISTINCT FROM 'number' THEN d.value
+        WHEN (d.value->>'day')::numeric = ANY(day_numbers::numeric[])
+          THEN jsonb_set(d.value, '{completed}', to_jsonb(is_completed))
+        ELSE d.value
+      END ORDER BY d.ordinality
+    ), '[]'::jsonb)
+    FROM jsonb_array_elements(lp.roadmap->'days') WITH ORDINALITY AS d(value, ordinality)
+  ))
+  WHERE lp.id = set_learning_path_days.path_id
+    AND jsonb_typeof(lp.roadmap->'days') = 'array'
+  RETURNING (
+    SELECT count(*)::int
+    FROM jsonb_array_elements(lp.roadmap->'days') AS e(value)
+    WHERE CASE WHEN jsonb_typeof(e.value->'day') = 'number'
+      THEN (e.value->>'day')::numeric = ANY(day_numbers::numeric[])
+      ELSE false
+    END
+  ) INTO matched;
+
+  RETURN matched;
+END;
+$$;
@@ -0,0 +1,13 @@
+-- Hierarchical Master Summary
+
+-- 1. Every map (level 0, one per chunk) and reduce (level >= 1) output of the summary tree.
+--    input_hash identifies the node's inputs, so a resumed run only recomputes what changed or is missing.
+CREATE TABLE IF NOT EXISTS public.document_summary_nodes (
+    document_id UUID REFERENCES public.documents(id) ON DELETE CASCADE,
+    level INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    input_hash TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    PRIMARY KEY (document_id, level, position)
+);